@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import ast
 import warnings
+from collections.abc import Iterable
 from typing import Protocol
 
 from tokenize_rt import Offset
@@ -22,3 +23,8 @@ class _HasOffsetInfo(Protocol):
 
 def ast_to_offset(node: _HasOffsetInfo) -> Offset:
     return Offset(node.lineno, node.col_offset)
+
+
+def ast_to_params(nodes: Iterable[_HasOffsetInfo]) -> tuple[int, ...]:
+    # the offsets of `nodes` as `line, col` pairs for the params of a callback
+    return tuple(n for node in nodes for n in (node.lineno, node.col_offset))
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+from collections.abc import Sequence
+
+# entries are a one byte marker optionally followed by the fixed source
+_CLEAN = b'='
+_FIXED = b'+'
+# the disk usage of the entries when the cache was last walked, and the disk
+# usage of each entry added since (a line each, appended by every run)
+_SIZE = '.size'
+_ADDED = '.added'
+
+
+@functools.cache
+def _salt() -> bytes:
+    # results change with the code of this package.  it is hashed rather than
+    # using its version from `importlib.metadata` which is slow to import
+    salt = hashlib.sha256(sys.version.encode())
+    package_dir = os.path.dirname(__file__)
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                path = os.path.join(dirpath, filename)
+                salt.update(os.path.relpath(path, package_dir).encode())
+                with open(path, 'rb') as f:
+                    salt.update(hashlib.sha256(f.read()).digest())
+    return salt.digest()
+
+
+def key(contents: bytes) -> str:
+    return hashlib.sha256(_salt() + contents).hexdigest()
+
+
+def _path(cache_dir: str, k: str) -> str:
+    return os.path.join(cache_dir, k[:2], k)
+
+
+def get(
+        cache_dirs: Sequence[str],
+        k: str,
+        orig: str,
+) -> tuple[str, bool] | None:
+    for cache_dir in cache_dirs:
+        path = _path(cache_dir, k)
+        try:
+            with open(path, 'rb') as f:
+                contents = f.read()
+        except OSError:
+            continue
+
+        # bump the mtime so eviction is least-recently-used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        if contents == _CLEAN:
+            return orig, False
+        elif contents[:1] == _FIXED:
+            return contents[1:].decode(), True
+    return None
+
+
+def put(cache_dirs: Sequence[str], k: str, fixed: str, changed: bool) -> None:
+    if changed:
+        data = _FIXED + fixed.encode()
+    else:
+        data = _CLEAN
+
+    path = _path(cache_dirs[0], k)
+    # the cache may be shared through a read-only mount
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    except OSError:
+        return
+
+    try:
+        with open(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        os.remove(tmp)
+        return
+
+    try:
+        usage = _usage(os.stat(path))
+        with open(os.path.join(cache_dirs[0], _ADDED), 'a') as f:
+            f.write(f'{usage}\n')
+    except OSError:  # pragma: no cover (raced with eviction)
+        pass
+
+
+def _usage(st: os.stat_result) -> int:
+    # a one byte entry takes a whole block
+    if sys.platform == 'win32':  # pragma: win32 cover
+        return st.st_size
+    else:  # pragma: win32 no cover
+        return st.st_blocks * 512
+
+
+def _estimate(cache_dir: str) -> int | None:
+    try:
+        with open(os.path.join(cache_dir, _SIZE)) as f:
+            total = int(f.read())
+    except (OSError, ValueError):
+        return None
+    try:
+        with open(os.path.join(cache_dir, _ADDED)) as f:
+            return total + sum(int(line) for line in f)
+    except FileNotFoundError:  # nothing was added since
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+def evict(cache_dir: str, max_size: int) -> None:
+    # the size of a cache which cannot be written (a shared read-only mount)
+    # is never recorded, every run would walk it
+    if not os.access(cache_dir, os.W_OK):
+        return
+
+    # walking every entry takes longer than fixing a few files, so the cache
+    # is only walked once the entries added since the last walk fill it
+    estimate = _estimate(cache_dir)
+    if estimate is not None and estimate <= max_size:
+        return
+
+    # entries added from here on are counted again by the next run, which
+    # only evicts sooner
+    try:
+        os.remove(os.path.join(cache_dir, _ADDED))
+    except OSError:
+        pass
+
+    entries = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_dir):
+        if dirpath == cache_dir:  # the size files
+            continue
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:  # pragma: no cover (raced with another process)
+                continue
+            usage = _usage(st)
+            entries.append((st.st_mtime, usage, path))
+            total += usage
+
+    # down to below the limit, so a full cache is not walked on every run
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size * 3 // 4:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+    try:
+        with open(os.path.join(cache_dir, _SIZE), 'w') as f:
+            f.write(f'{total}\n')
+    except OSError:  # pragma: no cover (raced with removing the cache)
+        pass
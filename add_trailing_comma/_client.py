@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import sys
+from collections.abc import Sequence
+
+from add_trailing_comma import _prefilter
+
+# a client for `add-trailing-comma --daemon`.  most of the time taken to fix a
+# single file is spent starting up, so this imports as little as possible
+
+
+class DaemonError(Exception):
+    pass
+
+
+def fix(path: str, contents_text: str) -> tuple[str, bool]:
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps({'src': contents_text}).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    # an empty reply: the daemon hung up without answering
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise DaemonError(f'invalid response: {line[:80]!r}')
+    if not isinstance(response, dict):
+        raise DaemonError(f'invalid response: {line[:80]!r}')
+    elif 'error' in response:
+        raise DaemonError(response['error'])
+    return response['src'], response['changed']
+
+
+def fix_file(filename: str, args: argparse.Namespace) -> int:
+    if filename == '-':
+        contents_bytes = sys.stdin.buffer.read()
+    else:
+        with open(filename, 'rb') as fb:
+            contents_bytes = fb.read()
+
+    try:
+        contents_text = contents_bytes.decode()
+    except UnicodeDecodeError:
+        msg = f'{filename} is non-utf-8 (not supported)'
+        print(msg, file=sys.stderr)
+        return 1
+
+    if _prefilter.unchanged(contents_bytes):
+        changed = False
+    else:
+        try:
+            contents_text, changed = fix(args.connect, contents_text)
+        except OSError:  # the daemon is not running, fix it here instead
+            from add_trailing_comma._main import _fix
+            contents_text, changed = _fix(contents_text)
+        except DaemonError as e:
+            print(f'{filename}: daemon error: {e}', file=sys.stderr)
+            return 1
+
+    if filename == '-':
+        print(contents_text, end='')
+    elif changed:
+        print(f'Rewriting {filename}', file=sys.stderr)
+        with open(filename, 'wb') as f:
+            f.write(contents_text.encode())
+
+    if args.exit_zero_even_if_changed:
+        return 0
+    else:
+        return changed
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filenames', nargs='*')
+    parser.add_argument('--exit-zero-even-if-changed', action='store_true')
+    parser.add_argument(
+        '--connect', metavar='SOCKET', required=True,
+        help=(
+            'the unix socket of an `add-trailing-comma --daemon`.  files are '
+            'fixed in this process if it is not running'
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    ret = 0
+    for filename in args.filenames:
+        ret |= fix_file(filename, args)
+    return ret
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import heapq
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+
+from tokenize_rt import src_to_tokens
+
+from add_trailing_comma._ast_helpers import ast_parse
+from add_trailing_comma._data import Callbacks
+from add_trailing_comma._data import FUNCS
+from add_trailing_comma._data import visit
+from add_trailing_comma._metrics import Counts
+from add_trailing_comma._profile import timed
+from add_trailing_comma._profile import Timings
+from add_trailing_comma._ranges import IntervalIndex
+from add_trailing_comma._ranges import LineRanges
+from add_trailing_comma._token_helpers import find_simple
+from add_trailing_comma._token_helpers import fix_generic
+from add_trailing_comma._token_helpers import Tokens
+from add_trailing_comma._token_helpers import WouldChange
+
+
+def _callback_indices(
+        tokens: Tokens,
+        callbacks: Callbacks,
+) -> Iterator[tuple[int, int]]:
+    # `(token, callback)` in order, each is searched for after the one before
+    # it.  the sort is stable so the callbacks of a token run in the order
+    # that they were added
+    original = tokens.original
+    lo = 0
+    for k in sorted(range(len(callbacks)), key=callbacks.offset):
+        offset = callbacks.offset(k)
+        i = lo = tokens.find_offset(offset, lo=lo)
+        # DEDENT is a zero length token
+        while i < len(original) and not original[i].src:
+            i += 1
+        if i < len(original) and original[i].offset == offset:
+            yield i, k
+
+
+def _brace_lines(tokens: Tokens) -> Iterator[tuple[int, int, int]]:
+    for first, brace in tokens.braces.items():
+        start = tokens.original[first].line
+        end = tokens.original[brace.close].line
+        assert start is not None and end is not None
+        yield start, end, first
+
+
+def _fixable_lines(tokens: Tokens) -> Iterator[int]:
+    for i in tokens.single_line_fixes:
+        line = tokens.original[i].line
+        assert line is not None
+        yield line
+
+
+@functools.cache
+def _plugin_name(func: Callable[..., object]) -> str:
+    # `add_trailing_comma._plugins._with` => `with`
+    return func.__module__.rpartition('.')[2].lstrip('_')
+
+
+def fix_tokens(
+        contents_text: str,
+        line_ranges: LineRanges | None = None,
+        timings: Timings | None = None,
+        counts: Counts | None = None,
+        check: bool = False,
+) -> Tokens | None:
+    if line_ranges is not None and not line_ranges:
+        return None
+
+    try:
+        with timed(timings, 'parse'):
+            ast_obj = ast_parse(contents_text)
+    except SyntaxError:
+        if counts is not None:
+            counts['files_syntax_error', ''] += 1
+        return None
+
+    with timed(timings, 'tokenize'):
+        tokens = Tokens(src_to_tokens(contents_text))
+    tokens.check = check
+
+    with timed(timings, 'visit'):
+        # nodes on other lines which fit on one line are not walked
+        fixable_lines = set(_fixable_lines(tokens))
+        callbacks = visit(FUNCS, ast_obj, line_ranges, fixable_lines)
+    # the tree is larger than the tokens, it is not needed to fix them
+    del ast_obj
+
+    if line_ranges is None:
+        braces: Iterable[int] = tokens.braces
+    else:
+        # only brackets overlapping the changed lines are fixed
+        index = IntervalIndex(_brace_lines(tokens))
+        braces = tokens.in_ranges = {
+            i
+            for start, end in line_ranges
+            for i in index.overlapping(start, end)
+        }
+    # the tokens are looked up by position once, then only the tokens with
+    # callbacks and the brackets are stepped through (most tokens are neither).
+    # a bracket sorts after the callbacks of its token
+    brace = len(callbacks)
+    steps = heapq.merge(
+        _callback_indices(tokens, callbacks),
+        sorted((i, brace) for i in braces if tokens.fixable(i)),
+    )
+
+    # with `check` the first edit stops fixing, the file has changed
+    with timed(timings, 'fix'), contextlib.suppress(WouldChange):
+        for i, k in steps:
+            if k != brace:
+                _, func, params = callbacks[k]
+                tokens.plugin = _plugin_name(func)
+                tokens.counts['callbacks', tokens.plugin] += 1
+                if timings is None:
+                    func(i, tokens, *params)
+                else:
+                    with timed(timings, f'fix.{tokens.plugin}'):
+                        func(i, tokens, *params)
+            elif i not in tokens.swept:
+                if timings is None:
+                    fix_generic(tokens, find_simple(i, tokens))
+                else:
+                    with timed(timings, 'fix.braces'):
+                        fix_generic(tokens, find_simple(i, tokens))
+
+    if counts is not None:
+        counts['files_parsed', ''] += 1
+        counts.update(tokens.counts)
+    return tokens
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from typing import Any
+
+from add_trailing_comma.api import fix_source
+
+# the protocol is one json object per line, one request per connection:
+#
+#   -> {"src": "..."}
+#   <- {"src": "...", "changed": true, "edits": [...], "elapsed": 0.001}
+#   <- {"error": "..."}
+
+
+def _response(line: bytes) -> dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'error': f'invalid json: {e}'}
+    if (
+            not isinstance(request, dict) or
+            not isinstance(request.get('src'), str)
+    ):
+        return {'error': 'expected {"src": str}'}
+
+    try:
+        result = fix_source(request['src'])
+    except Exception as e:  # the client reports it rather than hanging up
+        return {'error': f'{type(e).__name__}: {e}'}
+    return {
+        'src': result.src,
+        'changed': result.changed,
+        'edits': [edit._asdict() for edit in result.edits],
+        'elapsed': result.elapsed,
+    }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        # `serve` connects without a request to check if a daemon is running
+        if not line:
+            return
+        response = _response(line)
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, jobs: int, idle_timeout: float) -> None:
+        super().__init__(path, _Handler)
+        # waiting for a slot stops accepting, further clients queue up in the
+        # socket's backlog
+        self._slots = threading.BoundedSemaphore(jobs)
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self.timeout = idle_timeout
+        self.idle = False
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self._slots.acquire()
+        with self._active_lock:
+            self._active += 1
+        super().process_request(request, client_address)
+
+    def process_request_thread(
+            self,
+            request: Any,
+            client_address: Any,
+    ) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._active_lock:
+                self._active -= 1
+            self._slots.release()
+
+    def handle_timeout(self) -> None:
+        # nothing connected for `timeout` seconds
+        with self._active_lock:
+            self.idle = self._active == 0
+
+
+def _is_running(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+        else:
+            return True
+
+
+def serve(path: str, jobs: int, idle_timeout: float) -> int:
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            print(f'{path}: exists and is not a socket', file=sys.stderr)
+            return 1
+        elif _is_running(path):
+            print(f'{path}: already in use', file=sys.stderr)
+            return 1
+        else:  # left behind by a daemon which did not exit cleanly
+            os.remove(path)
+
+    with Server(path, jobs, idle_timeout) as server:
+        try:
+            while not server.idle:
+                server.handle_request()
+        finally:
+            os.remove(path)
+    return 0
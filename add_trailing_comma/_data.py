@@ -1,27 +1,93 @@
 from __future__ import annotations
 
+import array
 import ast
 import collections
-import pkgutil
+import re
 from collections.abc import Callable
 from collections.abc import Iterable
+from collections.abc import Sequence
+from typing import Any
 from typing import NamedTuple
 from typing import Protocol
 from typing import TypeVar
 
 from tokenize_rt import Offset
-from tokenize_rt import Token
 
 from add_trailing_comma import _plugins
+from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._ranges import LineRanges
 
 
 class State(NamedTuple):
     in_fstring: bool = False
+    # the node is a literal of constants, its elements are not walked so its
+    # callback fixes the literals inside of it as well
+    data_literal: bool = False
 
 
 AST_T = TypeVar('AST_T', bound=ast.AST)
-TokenFunc = Callable[[int, list[Token]], None]
-ASTFunc = Callable[[State, AST_T], Iterable[tuple[Offset, TokenFunc]]]
+# called as `func(i, tokens, *params)`
+TokenFunc = Callable[..., None]
+
+
+class Callback(NamedTuple):
+    offset: Offset
+    # a module level function rather than a `functools.partial` per node, its
+    # arguments are small integers: flags, counts and `line, col` pairs
+    func: TokenFunc
+    params: tuple[int, ...] = ()
+
+
+ASTFunc = Callable[[State, AST_T], Iterable[Callback]]
+
+
+class Callbacks:
+    # the callbacks of a file as parallel arrays, large files have millions
+    def __init__(self) -> None:
+        self.funcs: list[TokenFunc] = []
+        self._func_ids: dict[TokenFunc, int] = {}
+        self.lines = array.array('i')
+        self.cols = array.array('i')
+        self.func_ids = array.array('H')
+        # the params of callback `k` are `params[starts[k]:starts[k + 1]]`
+        self.starts = array.array('q', (0,))
+        self.params = array.array('i')
+
+    def __len__(self) -> int:
+        return len(self.func_ids)
+
+    def __getitem__(self, k: int) -> Callback:
+        params = self.params[self.starts[k]:self.starts[k + 1]]
+        func = self.funcs[self.func_ids[k]]
+        return Callback(self.offset(k), func, tuple(params))
+
+    def offset(self, k: int) -> Offset:
+        return Offset(self.lines[k], self.cols[k])
+
+    def append(
+            self,
+            offset: Offset,
+            func: TokenFunc,
+            params: tuple[int, ...] = (),
+    ) -> None:
+        line, col = offset
+        assert line is not None and col is not None
+        func_id = self._func_ids.get(func)
+        if func_id is None:
+            func_id = self._func_ids[func] = len(self.funcs)
+            self.funcs.append(func)
+        self.lines.append(line)
+        self.cols.append(col)
+        self.func_ids.append(func_id)
+        self.params.extend(params)
+        self.starts.append(len(self.params))
+
+
+def param_offsets(params: Sequence[int]) -> set[Offset]:
+    # the offsets in a callback's params (see `ast_to_params`)
+    return {Offset(*pair) for pair in zip(params[::2], params[1::2])}
+
 
 FUNCS: ASTCallbackMapping  # python/mypy#17566
 FUNCS = collections.defaultdict(list)  # type: ignore[assignment]
@@ -37,42 +103,269 @@ def register(tp: type[AST_T]) -> Callable[[ASTFunc[AST_T]], ASTFunc[AST_T]]:
 class ASTCallbackMapping(Protocol):
     def __getitem__(self, tp: type[AST_T]) -> list[ASTFunc[AST_T]]: ...
 
+    def items(self) -> Iterable[tuple[type[ast.AST], list[ASTFunc[Any]]]]: ...
 
-def visit(
-        funcs: ASTCallbackMapping,
-        tree: ast.AST,
-) -> dict[Offset, list[TokenFunc]]:
-    nodes = [(tree, State())]
 
-    ret = collections.defaultdict(list)
+def _stmt_lines(node: ast.stmt) -> tuple[int, int]:
+    start = node.lineno
+    # decorators come before the `def` / `class` line
+    for decorator in getattr(node, 'decorator_list', ()):
+        start = min(start, decorator.lineno)
+    return start, node.end_lineno or node.lineno
+
+
+_LITERALS = frozenset((ast.Dict, ast.List, ast.Set, ast.Tuple))
+
+
+def _constant(node: ast.AST) -> bool:
+    # only constants and literals of constants
+    stack: list[ast.AST | None] = [node]
+    while stack:
+        elt = stack.pop()
+        tp = type(elt)
+        if tp is ast.Constant:
+            continue
+        elif isinstance(elt, ast.UnaryOp):  # `-1`
+            if type(elt.operand) is not ast.Constant:
+                return False
+        elif isinstance(elt, ast.Dict):  # `**x` is a `None` key
+            stack.extend(elt.keys)
+            stack.extend(elt.values)
+        elif isinstance(elt, (ast.List, ast.Set, ast.Tuple)):
+            stack.extend(elt.elts)
+        else:
+            return False
+    return True
+
+
+def _elts(node: ast.AST) -> Sequence[ast.expr | None]:
+    if isinstance(node, ast.Dict):
+        return [*node.keys, *node.values]
+    else:
+        assert isinstance(node, (ast.List, ast.Set, ast.Tuple))
+        return node.elts
+
+
+def _inner_literals(root: ast.AST, ret: dict[int, bool]) -> None:
+    # the walk goes on to the literals inside of a literal which is not
+    # constant.  whether they are constant is found bottom up in one pass
+    # rather than each of them rescanning the literals inside of it
+    constant: dict[int, bool] = {}
+    stack: list[tuple[ast.AST, bool]] = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        elts = _elts(node)
+        if not children_done:
+            stack.append((node, True))
+            for elt in elts:
+                if isinstance(elt, (ast.Dict, ast.List, ast.Set, ast.Tuple)):
+                    stack.append((elt, False))
+            continue
+
+        children = {}
+        node_constant = True
+        for elt in elts:
+            if isinstance(elt, (ast.Dict, ast.List, ast.Set, ast.Tuple)):
+                children[id(elt)] = elt_constant = constant.pop(id(elt))
+            elif isinstance(elt, ast.UnaryOp):  # `-1`
+                elt_constant = type(elt.operand) is ast.Constant
+            else:
+                elt_constant = type(elt) is ast.Constant
+            node_constant = node_constant and elt_constant
+        # only the literals which the walk reaches are kept
+        if not node_constant:
+            ret.update(children)
+        constant[id(node)] = node_constant
+
+
+def _data_literal(node: ast.AST, literals: dict[int, bool]) -> bool:
+    # literals of constants and of other such literals: generated tables,
+    # json, ...  an unparenthesized tuple is fixed by the bracket before it.
+    # `literals` (by `id()`) are those inside of literals already checked
+    if isinstance(node, ast.Dict):
+        elts = node.values
+    else:
+        assert isinstance(node, (ast.List, ast.Set, ast.Tuple))
+        elts = node.elts
+    if not elts:
+        return False
+    elif (
+            isinstance(node, ast.Tuple) and
+            ast_to_offset(node) == ast_to_offset(elts[0])
+    ):
+        return False
+
+    constant = literals.get(id(node))
+    if constant is None:
+        constant = _constant(node)
+        if not constant:
+            _inner_literals(node, literals)
+    return constant
+
+
+# how each field of a node is walked
+_NODE, _LIST, _ANY = range(3)
+# `Name(identifier id, expr_context ctx)`: the fields of each node type, in
+# the docstrings generated from python's ASDL grammar
+_SIGNATURE = re.compile(r'^\w+\((.+)\)$')
+_SCALARS = frozenset(('identifier', 'int', 'string', 'constant'))
+
+
+def _has_fields(tp: type[ast.AST]) -> bool:
+    return bool(tp._fields) or any(_has_fields(t) for t in tp.__subclasses__())
+
+
+def _child_fields(tp: type[ast.AST]) -> tuple[tuple[str, int], ...]:
+    # the fields which may hold nodes, reversed to be pushed onto the stack.
+    # operators and contexts (`Add()`, `Load()`) have no fields or positions
+    # so no plugin can use them and they are not walked
+    match = _SIGNATURE.match(tp.__doc__ or '')
+    if match is None:
+        return tuple((name, _ANY) for name in reversed(tp._fields))
+
+    ret = []
+    for field in reversed(match[1].split(', ')):
+        asdl_type, name = field.split()
+        if asdl_type.endswith('*'):
+            kind = _LIST
+        else:
+            kind = _NODE
+        asdl_type = asdl_type.rstrip('*?')
+        node_type = getattr(ast, asdl_type, None)
+        if asdl_type in _SCALARS:
+            continue
+        elif not isinstance(node_type, type):
+            ret.append((name, _ANY))
+        elif _has_fields(node_type):
+            ret.append((name, kind))
+    return tuple(ret)
+
+
+_CHILD_FIELDS: dict[type[ast.AST], tuple[tuple[str, int], ...]] = {}
+
+
+def _walk(
+        nodes: list[ast.AST | None],
+        state: State,
+        dispatch: dict[type[ast.AST], list[ASTFunc[Any]]],
+        line_ranges: LineRanges | None,
+        fixable_lines: set[int] | None,
+        literals: dict[int, bool],
+        ret: Callbacks,
+) -> None:
+    child_fields = _CHILD_FIELDS
+    # optional fields and some lists (`Dict.keys` for `**x`) hold `None`,
+    # these are pushed and skipped rather than checked for each field
     while nodes:
-        node, state = nodes.pop()
+        node = nodes.pop()
+        if node is None:
+            continue
 
         tp = type(node)
-        for ast_func in funcs[tp]:
-            for offset, token_func in ast_func(state, node):
-                ret[offset].append(token_func)
+        if (
+                line_ranges is not None and
+                isinstance(node, ast.stmt) and
+                not line_ranges.intersects(*_stmt_lines(node))
+        ):
+            continue
+
+        # a node on one line only has single line brackets, these are only
+        # fixed on some lines.  unparenthesized tuples are the exception, they
+        # are fixed by the bracket before them: `x[\n    1, 2\n]`.  nodes
+        # without positions (`arguments`, `comprehension`, ...) are walked
+        if fixable_lines is not None and tp is not ast.Tuple:
+            end_lineno = getattr(node, 'end_lineno', None)
+            if (
+                    end_lineno is not None and
+                    end_lineno not in fixable_lines and
+                    end_lineno == getattr(node, 'lineno', None) and
+                    # decorators come before the `def` / `class` line
+                    not getattr(node, 'decorator_list', None)
+            ):
+                continue
 
-        if tp is ast.FormattedValue:
-            state = state._replace(in_fstring=True)
+        if (
+                tp in _LITERALS and
+                not state.in_fstring and
+                _data_literal(node, literals)
+        ):
+            # the constants of large literals are most of the nodes of a file
+            data_state = state._replace(data_literal=True)
+            for ast_func in dispatch.get(tp, ()):
+                for callback in ast_func(data_state, node):
+                    ret.append(*callback)
+            continue
 
-        for name in reversed(node._fields):
+        ast_funcs = dispatch.get(tp)
+        if ast_funcs is not None:
+            for ast_func in ast_funcs:
+                for callback in ast_func(state, node):
+                    ret.append(*callback)
+
+        if isinstance(node, ast.FormattedValue) and not state.in_fstring:
+            # the state only changes here (and for the literals above, which
+            # are not walked) so the stack holds only nodes
+            children: list[ast.AST | None] = [node.format_spec, node.value]
+            # positions inside of multi-line f-strings are not reliable before
+            # python 3.12 so these are never pruned
+            _walk(
+                children, State(in_fstring=True), dispatch, line_ranges, None,
+                literals, ret,
+            )
+            continue
+
+        try:
+            fields = child_fields[tp]
+        except KeyError:
+            fields = child_fields[tp] = _child_fields(tp)
+        for name, kind in fields:
             value = getattr(node, name)
-            if isinstance(value, ast.AST):
-                nodes.append((value, state))
+            if kind is _NODE:
+                nodes.append(value)
+            elif kind is _LIST:
+                nodes.extend(reversed(value))
+            elif isinstance(value, ast.AST):
+                nodes.append(value)
             elif isinstance(value, list):
-                for value in reversed(value):
-                    if isinstance(value, ast.AST):
-                        nodes.append((value, state))
+                nodes.extend(
+                    v for v in reversed(value) if isinstance(v, ast.AST)
+                )
+
+
+def visit(
+        funcs: ASTCallbackMapping,
+        tree: ast.AST,
+        line_ranges: LineRanges | None = None,
+        fixable_lines: set[int] | None = None,
+) -> Callbacks:
+    # `fixable_lines` are the lines with single line brackets which may be
+    # fixed (see `Tokens.single_line_fixes`), other single line nodes are
+    # skipped
+    # only the types which have callbacks, without adding to `funcs`
+    dispatch = {tp: ast_funcs for tp, ast_funcs in funcs.items() if ast_funcs}
+    ret = Callbacks()
+    _walk([tree], State(), dispatch, line_ranges, fixable_lines, {}, ret)
     return ret
 
 
+# the modules of `_plugins`, listed rather than found on disk at import time
+# (the tests check that this is up to date)
+PLUGINS = (
+    '_with',
+    'calls',
+    'classes',
+    'functions',
+    'imports',
+    'literals',
+    'match',
+    'pep695',
+)
+
+
 def _import_plugins() -> None:
     # trigger an import of all of the plugins
-    plugins_path = _plugins.__path__
-    mod_infos = pkgutil.walk_packages(plugins_path, f'{_plugins.__name__}.')
-    for _, name, _ in mod_infos:
-        __import__(name, fromlist=['_trash'])
+    for name in PLUGINS:
+        __import__(f'{_plugins.__name__}.{name}', fromlist=['_trash'])
 
 
 _import_plugins()
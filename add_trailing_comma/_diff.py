@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import bisect
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from add_trailing_comma._token_helpers import apply_edits
+from add_trailing_comma._token_helpers import Edit
+
+
+class _Block(NamedTuple):
+    # `[lo, hi)` lines of the original which are replaced by `new`
+    lo: int
+    hi: int
+    new: list[str]
+
+
+def _split_lines(src: str) -> list[str]:
+    lines = src.split('\n')
+    ret = [f'{line}\n' for line in lines[:-1]]
+    if lines[-1]:
+        ret.append(lines[-1])
+    return ret
+
+
+def _range(start: int, length: int) -> str:
+    # same as `difflib`: empty ranges are numbered by the line before them
+    if length == 1:
+        return f'{start + 1}'
+    elif length == 0:
+        return f'{start},0'
+    else:
+        return f'{start + 1},{length}'
+
+
+def _blocks(src: str, lines: list[str], edits: Sequence[Edit]) -> list[_Block]:
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    # the whole lines each edit touches, merged where edits share a line
+    groups: list[tuple[int, int, list[Edit]]] = []
+    for edit in edits:
+        lo = bisect.bisect_right(line_starts, edit.start) - 1
+        hi = min(bisect.bisect_right(line_starts, edit.end), len(lines))
+        if groups and lo < groups[-1][1]:
+            prev_lo, _, prev_edits = groups[-1]
+            groups[-1] = (prev_lo, hi, [*prev_edits, edit])
+        else:
+            groups.append((lo, hi, [edit]))
+
+    blocks = []
+    for lo, hi, group in groups:
+        start, end = line_starts[lo], line_starts[hi]
+        old = lines[lo:hi]
+        group = [
+            edit._replace(start=edit.start - start, end=edit.end - start)
+            for edit in group
+        ]
+        new = _split_lines(apply_edits(src[start:end], group))
+        # unhugging ends edits at a newline, leaving whole lines unchanged
+        while old and new and old[-1] == new[-1]:
+            old.pop()
+            new.pop()
+            hi -= 1
+        n = 0
+        while n < len(old) and n < len(new) and old[n] == new[n]:
+            n += 1
+        if old[n:] or new[n:]:
+            blocks.append(_Block(lo + n, hi, new[n:]))
+    return blocks
+
+
+def _diff_lines(prefix: str, lines: list[str]) -> list[str]:
+    ret = [f'{prefix}{line}' for line in lines]
+    if ret and not ret[-1].endswith('\n'):
+        ret[-1] += '\n\\ No newline at end of file\n'
+    return ret
+
+
+def unified_diff(
+        filename: str,
+        src: str,
+        edits: Sequence[Edit],
+        context: int = 3,
+) -> str:
+    # built from the edits rather than by comparing every line, as `git diff`
+    # prints them (so the output of many files can be given to `git apply`)
+    lines = _split_lines(src)
+    blocks = _blocks(src, lines, edits)
+    if not blocks:
+        return ''
+
+    hunks: list[list[_Block]] = []
+    for block in blocks:
+        if hunks and block.lo - hunks[-1][-1].hi <= 2 * context:
+            hunks[-1].append(block)
+        else:
+            hunks.append([block])
+
+    ret = [f'--- a/{filename}\n', f'+++ b/{filename}\n']
+    # lines added so far, to number the new file's lines
+    offset = 0
+    for hunk in hunks:
+        start = max(hunk[0].lo - context, 0)
+        end = min(hunk[-1].hi + context, len(lines))
+        delta = sum(len(block.new) - (block.hi - block.lo) for block in hunk)
+        ret.append(
+            f'@@ -{_range(start, end - start)} '
+            f'+{_range(start + offset, end - start + delta)} @@\n',
+        )
+        pos = start
+        for block in hunk:
+            ret.extend(_diff_lines(' ', lines[pos:block.lo]))
+            ret.extend(_diff_lines('-', lines[block.lo:block.hi]))
+            ret.extend(_diff_lines('+', block.new))
+            pos = block.hi
+        ret.extend(_diff_lines(' ', lines[pos:end]))
+        offset += delta
+    return ''.join(ret)
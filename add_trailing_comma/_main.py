@@ -1,59 +1,96 @@
 from __future__ import annotations
 
 import argparse
+import collections
+import contextlib
+import functools
+import io
+import itertools
+import json
+import os
 import sys
-from collections.abc import Iterable
 from collections.abc import Sequence
+from typing import TYPE_CHECKING
 
-from tokenize_rt import src_to_tokens
-from tokenize_rt import Token
-from tokenize_rt import tokens_to_src
+from add_trailing_comma import _metrics
+from add_trailing_comma import _prefilter
+from add_trailing_comma import _profile
+from add_trailing_comma import _ranges
+from add_trailing_comma._core import fix_tokens
+from add_trailing_comma._metrics import Counts
+from add_trailing_comma._profile import Bracket
+from add_trailing_comma._profile import timed
+from add_trailing_comma._profile import Timings
+from add_trailing_comma._ranges import LineRanges
+from add_trailing_comma._token_helpers import Edit
+from add_trailing_comma.api import edits_json
 
-from add_trailing_comma._ast_helpers import ast_parse
-from add_trailing_comma._data import FUNCS
-from add_trailing_comma._data import visit
-from add_trailing_comma._token_helpers import find_simple
-from add_trailing_comma._token_helpers import fix_brace
-from add_trailing_comma._token_helpers import START_BRACES
+if TYPE_CHECKING:
+    import multiprocessing.context
+    import multiprocessing.synchronize
 
+# most runs fix a few files, the modules for processes, the cache, git, the
+# daemon, ... are imported by the options which use them
 
-def _changing_list(lst: list[Token]) -> Iterable[tuple[int, Token]]:
-    i = 0
-    while i < len(lst):
-        yield i, lst[i]
-        i += 1
+BRACKETS_PER_FILE = 5
+
+
+def _fix(
+        contents_text: str,
+        line_ranges: LineRanges | None = None,
+        timings: Timings | None = None,
+        counts: Counts | None = None,
+        check: bool = False,
+) -> tuple[str, bool]:
+    tokens = fix_tokens(contents_text, line_ranges, timings, counts, check)
+    if tokens is None:
+        return contents_text, False
+    elif check:
+        # fixing stopped at the first edit, there is nothing to render
+        return contents_text, tokens.dirty
+    else:
+        with timed(timings, 'render'):
+            return tokens.render(contents_text), tokens.dirty
+
+
+def _edits(
+        contents_text: str,
+        line_ranges: LineRanges | None = None,
+        timings: Timings | None = None,
+        counts: Counts | None = None,
+) -> list[Edit]:
+    tokens = fix_tokens(contents_text, line_ranges, timings, counts)
+    if tokens is None:
+        return []
+    else:
+        with timed(timings, 'render'):
+            return tokens.edits(contents_text)
 
 
 def _fix_src(contents_text: str) -> str:
-    try:
-        ast_obj = ast_parse(contents_text)
-    except SyntaxError:
-        return contents_text
-
-    callbacks = visit(FUNCS, ast_obj)
-
-    tokens = src_to_tokens(contents_text)
-    for i, token in _changing_list(tokens):
-        # DEDENT is a zero length token
-        if not token.src:
-            continue
-
-        # though this is a defaultdict, by using `.get()` this function's
-        # self time is almost 50% faster
-        for callback in callbacks.get(token.offset, ()):
-            callback(i, tokens)
-
-        if token.name == 'OP' and token.src in START_BRACES:
-            fix_brace(
-                tokens, find_simple(i, tokens),
-                add_comma=False,
-                remove_comma=False,
-            )
+    return _fix(contents_text)[0]
 
-    return tokens_to_src(tokens)
 
+def _line_ranges(
+        filename: str,
+        args: argparse.Namespace,
+) -> LineRanges | None:
+    if args.changed_lines is None:
+        return None
+    else:
+        return args.changed_lines.get(filename, LineRanges(()))
+
+
+def fix_file(
+        filename: str,
+        args: argparse.Namespace,
+        timings: Timings | None = None,
+        counts: Counts | None = None,
+) -> int:
+    if counts is None:
+        counts = collections.Counter()
+    counts['files', ''] += 1
 
-def fix_file(filename: str, args: argparse.Namespace) -> int:
     if filename == '-':
         contents_bytes = sys.stdin.buffer.read()
     else:
@@ -61,17 +98,64 @@ def fix_file(filename: str, args: argparse.Namespace) -> int:
             contents_bytes = fb.read()
 
     try:
-        contents_text_orig = contents_text = contents_bytes.decode()
+        contents_text = contents_bytes.decode()
     except UnicodeDecodeError:
         msg = f'{filename} is non-utf-8 (not supported)'
         print(msg, file=sys.stderr)
         return 1
 
-    contents_text = _fix_src(contents_text)
+    edits: list[Edit] = []
+    if _prefilter.unchanged(contents_bytes):
+        changed = False
+    elif args.diff or args.format == 'edits-json':
+        # only the edits are needed, which are not cached
+        edits = _edits(
+            contents_text, _line_ranges(filename, args), timings, counts,
+        )
+        changed = bool(edits)
+    elif args.changed_lines is not None:
+        line_ranges = _line_ranges(filename, args)
+        contents_text, changed = _fix(
+            contents_text, line_ranges, timings, counts, args.check,
+        )
+    elif args.cache_dir:
+        from add_trailing_comma import _cache
 
-    if filename == '-':
+        cache_key = _cache.key(contents_bytes)
+        cached = _cache.get(args.cache_dir, cache_key, contents_text)
+        if cached is not None:
+            contents_text, changed = cached
+        else:
+            contents_text, changed = _fix(
+                contents_text, timings=timings, counts=counts,
+                check=args.check,
+            )
+            if not args.check:
+                _cache.put(args.cache_dir, cache_key, contents_text, changed)
+    else:
+        contents_text, changed = _fix(
+            contents_text, timings=timings, counts=counts, check=args.check,
+        )
+
+    if changed:
+        counts['files_rewritten', ''] += 1
+
+    if args.check:
+        if changed:
+            print(f'Would rewrite {filename}', file=sys.stderr)
+    elif args.diff:
+        from add_trailing_comma._diff import unified_diff
+
+        print(unified_diff(filename, contents_text, edits), end='')
+    elif args.format == 'edits-json':
+        contents = {
+            'filename': filename,
+            'edits': edits_json(contents_text, edits),
+        }
+        print(json.dumps(contents))
+    elif filename == '-':
         print(contents_text, end='')
-    elif contents_text != contents_text_orig:
+    elif changed:
         print(f'Rewriting {filename}', file=sys.stderr)
         with open(filename, 'wb') as f:
             f.write(contents_text.encode())
@@ -79,18 +163,352 @@ def fix_file(filename: str, args: argparse.Namespace) -> int:
     if args.exit_zero_even_if_changed:
         return 0
     else:
-        return contents_text != contents_text_orig
+        return changed
+
+
+def _expensive_brackets(
+        contents_text: str,
+        line_ranges: LineRanges | None,
+) -> list[Bracket]:
+    # the scans are deterministic so fixing again finds the same brackets
+    tokens = fix_tokens(contents_text, line_ranges)
+    if tokens is None:
+        return []
+
+    ret = []
+    for i, n in tokens.bracket_scans.most_common(BRACKETS_PER_FILE):
+        line, col = tokens.original[i].offset
+        assert line is not None and col is not None
+        ret.append((line, col, n))
+    return ret
+
+
+def _profile_files(args: argparse.Namespace, counts: Counts) -> int:
+    files: dict[str, Timings] = {}
+    # the files are rewritten, keep what the slowest were to look at again
+    sources = {}
+    ret = 0
+    for filename in args.filenames:
+        if filename != '-':
+            with open(filename, 'rb') as f:
+                sources[filename] = f.read().decode(errors='replace')
+        timings = files[filename] = {}
+        with timed(timings, 'total'):
+            ret |= fix_file(filename, args, timings, counts)
+        if len(sources) > args.profile_top:
+            del sources[min(sources, key=lambda k: files[k]['total'])]
+        if ret and args.fail_fast:
+            break
+
+    slowest = [
+        filename for filename in _profile.slowest(files, args.profile_top)
+        if filename in sources
+    ]
+    brackets = {
+        filename: _expensive_brackets(
+            sources[filename], _line_ranges(filename, args),
+        )
+        for filename in slowest
+    }
+
+    report = _profile.report(files, args.profile_top, brackets)
+    print(report, end='', file=sys.stderr)
+    if args.profile_json is not None:
+        contents = _profile.to_json(files, args.profile_top, brackets)
+        with open(args.profile_json, 'w') as f:
+            json.dump(contents, f, indent=2)
+    if args.profile_output is not None:
+        funcs = [
+            (
+                filename,
+                functools.partial(
+                    _fix, sources[filename], _line_ranges(filename, args),
+                ),
+            )
+            for filename in slowest
+        ]
+        _profile.write_profile(args.profile_output, funcs)
+
+    return ret
+
+
+# set in the workers with `--fail-fast`, the first to fail stops the rest
+_stop: multiprocessing.synchronize.Event | None = None
+
+
+def _init_worker(stop: multiprocessing.synchronize.Event | None) -> None:
+    global _stop
+    _stop = stop
+
+
+def _fix_file_captured(
+        filename: str,
+        args: argparse.Namespace,
+) -> tuple[int, str, str, Counts]:
+    out, err = io.StringIO(), io.StringIO()
+    counts: Counts = collections.Counter()
+    if _stop is not None and _stop.is_set():
+        return 0, '', '', counts
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        ret = fix_file(filename, args, counts=counts)
+    if ret and _stop is not None:
+        _stop.set()
+    return ret, out.getvalue(), err.getvalue(), counts
+
+
+CGROUP_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+
+
+def _cpu_count() -> int:
+    if hasattr(os, 'sched_getaffinity'):  # pragma: no branch (linux)
+        cpus = len(os.sched_getaffinity(0))
+    else:  # pragma: no cover (not linux)
+        cpus = os.cpu_count() or 1
+
+    # containers commonly limit cpu time with a quota rather than affinity
+    try:
+        with open(CGROUP_CPU_MAX) as f:
+            quota_s, period_s = f.read().split()
+    except (OSError, ValueError):
+        return cpus
+    if quota_s == 'max':
+        return cpus
+    else:
+        return max(1, min(cpus, int(quota_s) // int(period_s)))
+
+
+def _jobs(s: str) -> int:
+    jobs = int(s)
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f'expected a positive int: {s!r}')
+    return jobs
+
+
+def _size(s: str) -> int:
+    suffixes = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    try:
+        if s[-1:].upper() in suffixes:
+            return int(s[:-1]) * suffixes[s[-1].upper()]
+        else:
+            return int(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected a size: {s!r}')
+
+
+def _mp_context() -> multiprocessing.context.BaseContext:
+    import multiprocessing
+
+    # forking keeps the already-built plugin registry in the workers
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    else:  # pragma: no cover (windows)
+        return multiprocessing.get_context()
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument('filenames', nargs='*')
     parser.add_argument('--exit-zero-even-if-changed', action='store_true')
+    parser.add_argument(
+        '-j', '--jobs', type=_jobs, default=None,
+        help='number of files to process in parallel (default: cpu count)',
+    )
+    parser.add_argument(
+        '--cache-dir', action='append', default=[],
+        help=(
+            'cache results by file contents in this directory.  may be '
+            'specified multiple times: all are searched, only the first is '
+            'written to (it may be read-only)'
+        ),
+    )
+    parser.add_argument(
+        '--cache-max-size', type=_size, default=_size('256M'),
+        help=(
+            'evict old cache entries once they take this much disk space '
+            '(accepts K / M / G)'
+        ),
+    )
+    parser.add_argument(
+        '--daemon', metavar='SOCKET',
+        help=(
+            'serve requests on this unix socket until idle (see '
+            '`add-trailing-comma-client`).  `--jobs` limits the concurrent '
+            'requests'
+        ),
+    )
+    parser.add_argument(
+        '--daemon-idle-timeout', type=float, default=600, metavar='SECONDS',
+        help='with `--daemon`: exit after this long without requests',
+    )
+    changed_lines = parser.add_mutually_exclusive_group()
+    changed_lines.add_argument(
+        '--line-ranges', type=_ranges.line_range, action='append',
+        metavar='START-END',
+        help=(
+            'only fix brackets overlapping these (1-indexed, inclusive) '
+            'lines.  may be specified multiple times, requires a single file'
+        ),
+    )
+    changed_lines.add_argument(
+        '--from-ref',
+        help=(
+            'only fix brackets overlapping lines changed since this git ref.  '
+            'files which git does not track are new, they are fixed entirely'
+        ),
+    )
+    parser.add_argument(
+        '--to-ref',
+        help=(
+            'with `--from-ref`: compare against this ref instead of the '
+            'working tree'
+        ),
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help=(
+            'print the time spent in each phase of fixing, and the slowest '
+            'files, to stderr.  files are fixed one at a time'
+        ),
+    )
+    parser.add_argument(
+        '--profile-top', type=int, default=10, metavar='N',
+        help='with `--profile`: the number of slowest files (default 10)',
+    )
+    parser.add_argument(
+        '--profile-json', metavar='FILE',
+        help='with `--profile`: also write the timings as json to this file',
+    )
+    parser.add_argument(
+        '--profile-output', metavar='FILE',
+        help=(
+            'with `--profile`: fix the slowest files again under a profiler '
+            'and write it to this file.  `.json` files are in speedscope\'s '
+            'format, otherwise `pstats` (`python -m pstats FILE`)'
+        ),
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--check', action='store_true',
+        help=(
+            'do not write files, print the ones which would be rewritten.  '
+            'fixing a file stops at its first change'
+        ),
+    )
+    output.add_argument(
+        '--diff', action='store_true',
+        help=(
+            'do not write files, print a unified diff of the changes.  the '
+            'diffs of all files together can be given to `git apply`'
+        ),
+    )
+    output.add_argument(
+        '--format', choices=('edits-json',),
+        help=(
+            'do not write files, print a line of json for each file: '
+            '`{"filename": ..., "edits": [...]}`.  each edit replaces '
+            '`old` at `[start, end)` (offsets into the original, also as '
+            'lines and columns) with `new`'
+        ),
+    )
+    parser.add_argument(
+        '--fail-fast', action='store_true',
+        help='with `--check`: stop at the first file which would be rewritten',
+    )
+    parser.add_argument(
+        '--metrics-file', metavar='FILE',
+        help=(
+            'write counters of the work done (per plugin: callbacks, fixes, '
+            'commas added / removed, ...) to this file in the openmetrics '
+            'text format'
+        ),
+    )
     args = parser.parse_args(argv)
 
+    if args.line_ranges is not None:
+        if len(args.filenames) != 1:
+            parser.error('--line-ranges requires exactly one filename')
+        args.changed_lines = {
+            args.filenames[0]: LineRanges(args.line_ranges),
+        }
+    elif args.from_ref is not None:
+        import subprocess
+
+        if '-' in args.filenames:
+            parser.error('--from-ref cannot read from stdin')
+        try:
+            args.changed_lines = _ranges.git_changed_lines(
+                args.from_ref, args.to_ref, args.filenames,
+            )
+        except subprocess.CalledProcessError:
+            return 1
+    elif args.to_ref is not None:
+        parser.error('--to-ref requires --from-ref')
+    else:
+        args.changed_lines = None
+
+    if args.daemon:
+        if args.filenames:
+            parser.error('--daemon does not take filenames')
+        from add_trailing_comma import _daemon
+
+        jobs = _cpu_count() if args.jobs is None else args.jobs
+        return _daemon.serve(args.daemon, jobs, args.daemon_idle_timeout)
+
+    if not args.profile and (
+            args.profile_json is not None or
+            args.profile_output is not None
+    ):
+        parser.error('--profile-json / --profile-output require --profile')
+    if args.fail_fast and not args.check:
+        parser.error('--fail-fast requires --check')
+
+    jobs = _cpu_count() if args.jobs is None else args.jobs
+    jobs = min(jobs, len(args.filenames))
+
+    counts: Counts = collections.Counter()
     ret = 0
-    for filename in args.filenames:
-        ret |= fix_file(filename, args)
+    if args.profile:
+        ret = _profile_files(args, counts)
+    elif jobs <= 1 or '-' in args.filenames:
+        for filename in args.filenames:
+            ret |= fix_file(filename, args, counts=counts)
+            if ret and args.fail_fast:
+                break
+    else:
+        import concurrent.futures
+
+        chunksize = max(1, min(64, len(args.filenames) // (jobs * 4)))
+        mp_context = _mp_context()
+        stop = mp_context.Event() if args.fail_fast else None
+        with concurrent.futures.ProcessPoolExecutor(
+                jobs, mp_context=mp_context,
+                initializer=_init_worker, initargs=(stop,),
+        ) as executor:
+            results = executor.map(
+                _fix_file_captured,
+                args.filenames,
+                itertools.repeat(args),
+                chunksize=chunksize,
+            )
+            # results are yielded in argument order so output is stable
+            for file_ret, out, err, file_counts in results:
+                sys.stdout.write(out)
+                sys.stderr.write(err)
+                ret |= file_ret
+                counts.update(file_counts)
+                if ret and args.fail_fast:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
+    if args.cache_dir:
+        from add_trailing_comma import _cache
+
+        _cache.evict(args.cache_dir[0], args.cache_max_size)
+
+    if args.metrics_file is not None:
+        with open(args.metrics_file, 'w') as f:
+            f.write(_metrics.openmetrics(counts))
+
     return ret
 
 
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import collections
+
+from add_trailing_comma._data import PLUGINS
+
+# counters keyed by `(metric, plugin)`, the plugin is `''` for counters of
+# the whole run and the helper for `tokens_scanned`.  only work done by this
+# run is counted: files which the prefilter or the cache skip are not parsed
+Counts = collections.Counter[tuple[str, str]]
+
+FILE_METRICS = {
+    'files': 'files checked',
+    'files_parsed': 'files parsed',
+    'files_syntax_error': 'files skipped as they are not valid python',
+    'files_rewritten': 'files which were changed',
+}
+PLUGIN_METRICS = {
+    'callbacks': 'callbacks run (per bracket for the generic `braces` pass)',
+    'fixes': 'callbacks which changed something',
+    'commas_added': 'trailing commas added',
+    'commas_removed': 'unnecessary commas removed',
+    'braces_unhugged': 'opening or closing braces moved to their own line',
+    'tokens_inserted': 'tokens inserted',
+}
+# `_with` => `with`, `braces` is the generic pass over every bracket
+PLUGIN_NAMES = (*sorted(name.lstrip('_') for name in PLUGINS), 'braces')
+# the helpers which walk tokens to find brackets (see `Tokens.scan`).  these
+# are deterministic so a jump between runs points at a quadratic walk
+SCAN_HELPERS = (
+    'find_simple', 'find_call', 'find_import', 'find_tuple', 'find_pep695',
+    'reindent',
+)
+
+
+def openmetrics(counts: Counts) -> str:
+    lines = []
+    for name, help_text in FILE_METRICS.items():
+        lines.append(f'# TYPE add_trailing_comma_{name} counter')
+        lines.append(f'# HELP add_trailing_comma_{name} {help_text}')
+        lines.append(f'add_trailing_comma_{name}_total {counts[name, ""]}')
+    for name, help_text in PLUGIN_METRICS.items():
+        lines.append(f'# TYPE add_trailing_comma_{name} counter')
+        lines.append(f'# HELP add_trailing_comma_{name} {help_text}')
+        for plugin in PLUGIN_NAMES:
+            lines.append(
+                f'add_trailing_comma_{name}_total{{plugin="{plugin}"}} '
+                f'{counts[name, plugin]}',
+            )
+    lines.append('# TYPE add_trailing_comma_tokens_scanned counter')
+    lines.append(
+        '# HELP add_trailing_comma_tokens_scanned '
+        'tokens walked to find brackets (lines for `reindent`)',
+    )
+    for helper in SCAN_HELPERS:
+        lines.append(
+            f'add_trailing_comma_tokens_scanned_total{{helper="{helper}"}} '
+            f'{counts["tokens_scanned", helper]}',
+        )
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
@@ -3,25 +3,26 @@ from __future__ import annotations
 import ast
 from collections.abc import Iterable
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
-
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._data import Callback
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_simple
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
-def _fix_with(i: int, tokens: list[Token]) -> None:
+def _fix_with(i: int, tokens: Tokens) -> None:
     i += 1
-    if tokens[i].name == 'UNIMPORTANT_WS':
+    if tokens.original[i].name == 'UNIMPORTANT_WS':
         i += 1
-    if tokens[i].src == '(':
+    if tokens.original[i].src == '(':
         fix = find_simple(i, tokens)
         # only fix if outer parens are for the with items (next is ':')
-        if fix is not None and tokens[fix.braces[-1] + 1].src == ':':
+        if fix is None:
+            return
+        after_close = tokens.get(tokens.next((fix.braces[-1], -1)))
+        if after_close.src == ':':
             fix_brace(tokens, fix, add_comma=True, remove_comma=True)
 
 
@@ -29,5 +30,5 @@ def _fix_with(i: int, tokens: list[Token]) -> None:
 def visit_With(
     state: State,
     node: ast.With,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    yield ast_to_offset(node), _fix_with
+) -> Iterable[Callback]:
+    yield Callback(ast_to_offset(node), _fix_with)
@@ -1,29 +1,34 @@
 from __future__ import annotations
 
 import ast
-import functools
 from collections.abc import Iterable
 
 from tokenize_rt import Offset
-from tokenize_rt import Token
 
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._ast_helpers import ast_to_params
+from add_trailing_comma._data import Callback
+from add_trailing_comma._data import param_offsets
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_call
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
 def _fix_call(
         i: int,
-        tokens: list[Token],
-        *,
-        arg_offsets: set[Offset],
+        tokens: Tokens,
+        func_end_line: int,
+        func_end_col: int,
+        *arg_offsets: int,
 ) -> None:
+    # every call of a chain (`x.f().g()`) starts at `x`, look for the
+    # arguments after the callee rather than walking the chain each time
+    i = tokens.find_offset(Offset(func_end_line, func_end_col), lo=i)
     return fix_brace(
         tokens,
-        find_call(arg_offsets, i, tokens),
+        find_call(param_offsets(arg_offsets), i, tokens),
         add_comma=True,
         remove_comma=True,
     )
@@ -33,14 +38,13 @@ def _fix_call(
 def visit_Call(
         state: State,
         node: ast.Call,
-) -> Iterable[tuple[Offset, TokenFunc]]:
+) -> Iterable[Callback]:
     argnodes: list[ast.expr | ast.keyword] = [*node.args, *node.keywords]
-    arg_offsets = set()
-    for argnode in argnodes:
-        offset = ast_to_offset(argnode)
+    arg_offsets = ast_to_params(
+        argnode for argnode in argnodes
         # multiline strings have invalid position, ignore them
-        if offset.utf8_byte_offset != -1:  # pragma: no branch (cpy bug)
-            arg_offsets.add(offset)
+        if argnode.col_offset != -1
+    )
 
     # If the sole argument is a generator, don't add a trailing comma as
     # this breaks lib2to3 based tools
@@ -49,8 +53,7 @@ def visit_Call(
     )
 
     if arg_offsets and not only_a_generator and not state.in_fstring:
-        func = functools.partial(
-            _fix_call,
-            arg_offsets=arg_offsets,
-        )
-        yield ast_to_offset(node), func
+        end_line, end_col = node.func.end_lineno, node.func.end_col_offset
+        assert end_line is not None and end_col is not None
+        params = (end_line, end_col, *arg_offsets)
+        yield Callback(ast_to_offset(node), _fix_call, params)
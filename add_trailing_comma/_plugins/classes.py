@@ -1,29 +1,27 @@
 from __future__ import annotations
 
 import ast
-import functools
 from collections.abc import Iterable
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
-
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._ast_helpers import ast_to_params
+from add_trailing_comma._data import Callback
+from add_trailing_comma._data import param_offsets
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_call
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
 def _fix_class(
         i: int,
-        tokens: list[Token],
-        *,
-        arg_offsets: set[Offset],
+        tokens: Tokens,
+        *arg_offsets: int,
 ) -> None:
     fix_brace(
         tokens,
-        find_call(arg_offsets, i, tokens),
+        find_call(param_offsets(arg_offsets), i, tokens),
         add_comma=True,
         remove_comma=True,
     )
@@ -33,13 +31,12 @@ def _fix_class(
 def visit_ClassDef(
         state: State,
         node: ast.ClassDef,
-) -> Iterable[tuple[Offset, TokenFunc]]:
+) -> Iterable[Callback]:
     # starargs are allowed in py3 class definitions, py35+ allows trailing
     # commas.  py34 does not, but adding an option for this very obscure
     # case seems not worth it.
     args: list[ast.expr | ast.keyword] = [*node.bases, *node.keywords]
-    arg_offsets = {ast_to_offset(arg) for arg in args}
+    arg_offsets = ast_to_params(args)
 
     if arg_offsets:
-        func = functools.partial(_fix_class, arg_offsets=arg_offsets)
-        yield ast_to_offset(node), func
+        yield Callback(ast_to_offset(node), _fix_class, arg_offsets)
@@ -3,31 +3,31 @@ from __future__ import annotations
 import ast
 from collections.abc import Iterable
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
-
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._data import Callback
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_simple
 from add_trailing_comma._token_helpers import Fix
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
-def _find_import(i: int, tokens: list[Token]) -> Fix | None:
+def _find_import(i: int, tokens: Tokens) -> Fix | None:
     # progress forwards until we find either a `(` or a newline
-    for i in range(i, len(tokens)):
-        token = tokens[i]
+    for n in range(i, len(tokens.original)):
+        token = tokens.original[n]
         if token.name == 'NEWLINE':
+            tokens.scan('find_import', None, n - i + 1)
             return None
         elif token.name == 'OP' and token.src == '(':
-            return find_simple(i, tokens)
+            tokens.scan('find_import', n, n - i + 1)
+            return find_simple(n, tokens)
     else:
         raise AssertionError('Past end?')
 
 
-def _fix_import(i: int, tokens: list[Token]) -> None:
+def _fix_import(i: int, tokens: Tokens) -> None:
     fix_brace(
         tokens,
         _find_import(i, tokens),
@@ -40,5 +40,5 @@ def _fix_import(i: int, tokens: list[Token]) -> None:
 def visit_ImportFrom(
         state: State,
         node: ast.ImportFrom,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    yield ast_to_offset(node), _fix_import
+) -> Iterable[Callback]:
+    yield Callback(ast_to_offset(node), _fix_import)
@@ -1,82 +1,146 @@
 from __future__ import annotations
 
 import ast
-import functools
 from collections.abc import Iterable
 
 from tokenize_rt import NON_CODING_TOKENS
 from tokenize_rt import Offset
-from tokenize_rt import Token
 
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._data import Callback
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_simple
 from add_trailing_comma._token_helpers import Fix
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import fix_generic
+from add_trailing_comma._token_helpers import START_BRACES
+from add_trailing_comma._token_helpers import Tokens
 
 
-def _fix_literal(
+def _fix_literal_brace(tokens: Tokens, fix: Fix | None) -> None:
+    fix_brace(tokens, fix, add_comma=True, remove_comma=True)
+
+
+def _fix_literal(i: int, tokens: Tokens) -> None:
+    _fix_literal_brace(tokens, find_simple(i, tokens))
+
+
+def _has_elts(tokens: Tokens, fix: Fix) -> bool:
+    # `node.elts` / `node.values` of the bracket's node
+    first_brace, last_brace = fix.braces
+    c = tokens.next((first_brace, -1))
+    while tokens.get(c).name in NON_CODING_TOKENS:
+        c = tokens.next(c)
+    return c != (last_brace, -1)
+
+
+def _is_one_el_tuple(tokens: Tokens, fix: Fix) -> bool:
+    # `len(node.elts) == 1` of the bracket's node: `(1,)`
+    first_brace, last_brace = fix.braces
+    if tokens.braces[first_brace].commas != 1:
+        return False
+    c = tokens.prev((last_brace, -1))
+    while tokens.get(c).name in NON_CODING_TOKENS:
+        c = tokens.prev(c)
+    return tokens.get(c).src == ','
+
+
+def _fix_data_literal(
         i: int,
-        tokens: list[Token],
-        *,
-        one_el_tuple: bool,
+        tokens: Tokens,
+        end_line: int,
+        end_col: int,
 ) -> None:
-    fix_brace(
-        tokens, find_simple(i, tokens),
-        add_comma=True,
-        remove_comma=not one_el_tuple,
-    )
+    # the elements of a literal of constants are not visited, its brackets
+    # are fixed in one pass in the order (and the same way) that the
+    # callbacks of `visit_*` followed by the generic pass would fix them.  a
+    # bracket's fixes only edit after its opening line so it is only looked
+    # up once
+    end = tokens.find_offset(Offset(end_line, end_col), lo=i)
+    for j in range(i, end):
+        token = tokens.original[j]
+        if token.name != 'OP' or token.src not in START_BRACES:
+            continue
+        tokens.swept.add(j)
+        if not tokens.fixable(j):
+            continue
+
+        fix = find_simple(j, tokens)
+        assert fix is not None
+        if token.src == '(':
+            # the brackets of a data literal are its parenthesized tuples
+            # (`visit_Tuple`) or parenthesized constants: `(-1)`
+            _fix_tuple_brace(tokens, fix, _is_one_el_tuple(tokens, fix))
+        elif _has_elts(tokens, fix):
+            # `visit_List` / `visit_Dict`: `[]` and `{}` have no callback
+            _fix_literal_brace(tokens, fix)
+        fix_generic(tokens, fix)
+
+
+def _data_literal(node: ast.expr) -> Callback:
+    assert node.end_lineno is not None and node.end_col_offset is not None
+    params = (node.end_lineno, node.end_col_offset)
+    return Callback(ast_to_offset(node), _fix_data_literal, params)
 
 
 @register(ast.Set)
 def visit_Set(
         state: State,
         node: ast.Set,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    func = functools.partial(_fix_literal, one_el_tuple=False)
-    yield ast_to_offset(node), func
+) -> Iterable[Callback]:
+    if state.data_literal:
+        yield _data_literal(node)
+    else:
+        yield Callback(ast_to_offset(node), _fix_literal)
 
 
 @register(ast.List)
 def visit_List(
         state: State,
         node: ast.List,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    if node.elts:
-        func = functools.partial(_fix_literal, one_el_tuple=False)
-        yield ast_to_offset(node), func
+) -> Iterable[Callback]:
+    if state.data_literal:
+        yield _data_literal(node)
+    elif node.elts:
+        yield Callback(ast_to_offset(node), _fix_literal)
 
 
 @register(ast.Dict)
 def visit_Dict(
         state: State,
         node: ast.Dict,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    if node.values:
-        func = functools.partial(_fix_literal, one_el_tuple=False)
-        yield ast_to_offset(node), func
+) -> Iterable[Callback]:
+    if state.data_literal:
+        yield _data_literal(node)
+    elif node.values:
+        yield Callback(ast_to_offset(node), _fix_literal)
 
 
-def _find_tuple(i: int, tokens: list[Token]) -> Fix | None:
+def _find_tuple(i: int, tokens: Tokens) -> Fix | None:
     # tuples are evil, we need to backtrack to find the opening paren
-    i -= 1
-    while tokens[i].name in NON_CODING_TOKENS:
-        i -= 1
+    # (through the edits: the bracket before may have been unhugged)
+    c = tokens.prev((i, -1))
+    n = 1
+    while tokens.get(c).name in NON_CODING_TOKENS:
+        c = tokens.prev(c)
+        n += 1
     # Sometimes tuples don't even have a paren!
     # x = 1, 2, 3
-    if tokens[i].src != '(' and tokens[i].src != '[':
+    token = tokens.get(c)
+    if token.src != '(' and token.src != '[':
+        tokens.scan('find_tuple', None, n)
         return None
 
-    return find_simple(i, tokens)
+    # brackets are never inserted, this is an original token
+    tokens.scan('find_tuple', c[0], n)
+    return find_simple(c[0], tokens)
 
 
 def _fix_tuple(
         i: int,
-        tokens: list[Token],
-        *,
-        one_el_tuple: bool,
+        tokens: Tokens,
+        one_el_tuple: int,
 ) -> None:
     fix_brace(
         tokens,
@@ -86,14 +150,11 @@ def _fix_tuple(
     )
 
 
-def _fix_tuple_py38(
-        i: int,
-        tokens: list[Token],
-        *,
-        one_el_tuple: bool,
+def _fix_tuple_brace(
+        tokens: Tokens,
+        fix: Fix | None,
+        one_el_tuple: int,
 ) -> None:
-    fix = find_simple(i, tokens)
-
     # for tuples we *must* find a comma, otherwise it is not a tuple
     if fix is None or not fix.multi_arg:
         return
@@ -106,16 +167,24 @@ def _fix_tuple_py38(
     )
 
 
+def _fix_tuple_py38(
+        i: int,
+        tokens: Tokens,
+        one_el_tuple: int,
+) -> None:
+    _fix_tuple_brace(tokens, find_simple(i, tokens), one_el_tuple)
+
+
 @register(ast.Tuple)
 def visit_Tuple(
         state: State,
         node: ast.Tuple,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    if node.elts:
-        is_one_el = len(node.elts) == 1
+) -> Iterable[Callback]:
+    if state.data_literal:
+        yield _data_literal(node)
+    elif node.elts:
+        params = (len(node.elts) == 1,)
         if ast_to_offset(node) == ast_to_offset(node.elts[0]):
-            func = functools.partial(_fix_tuple, one_el_tuple=is_one_el)
-            yield ast_to_offset(node), func
+            yield Callback(ast_to_offset(node), _fix_tuple, params)
         else:
-            func = functools.partial(_fix_tuple_py38, one_el_tuple=is_one_el)
-            yield ast_to_offset(node), func
+            yield Callback(ast_to_offset(node), _fix_tuple_py38, params)
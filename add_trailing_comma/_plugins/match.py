@@ -1,30 +1,28 @@
 from __future__ import annotations
 
 import ast
-import functools
 from collections.abc import Iterable
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
-
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._ast_helpers import ast_to_params
+from add_trailing_comma._data import Callback
+from add_trailing_comma._data import param_offsets
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_call
 from add_trailing_comma._token_helpers import find_simple
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
 def _fix_match_class(
         i: int,
-        tokens: list[Token],
-        *,
-        arg_offsets: set[Offset],
+        tokens: Tokens,
+        *arg_offsets: int,
 ) -> None:
     return fix_brace(
         tokens,
-        find_call(arg_offsets, i, tokens),
+        find_call(param_offsets(arg_offsets), i, tokens),
         add_comma=True,
         remove_comma=True,
     )
@@ -34,15 +32,13 @@ def _fix_match_class(
 def visit_MatchClass(
         state: State,
         node: ast.MatchClass,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    arg_offsets = {ast_to_offset(pat) for pat in node.patterns}
-    arg_offsets |= {ast_to_offset(pat) for pat in node.kwd_patterns}
+) -> Iterable[Callback]:
+    arg_offsets = ast_to_params([*node.patterns, *node.kwd_patterns])
     if arg_offsets:  # can't add commas without args!
-        func = functools.partial(_fix_match_class, arg_offsets=arg_offsets)
-        yield ast_to_offset(node), func
+        yield Callback(ast_to_offset(node), _fix_match_class, arg_offsets)
 
 
-def _fix_mapping(i: int, tokens: list[Token]) -> None:
+def _fix_mapping(i: int, tokens: Tokens) -> None:
     fix_brace(
         tokens,
         find_simple(i, tokens),
@@ -51,10 +47,10 @@ def _fix_mapping(i: int, tokens: list[Token]) -> None:
     )
 
 
-def _fix_sequence(i: int, tokens: list[Token], *, n: int) -> None:
-    if tokens[i].src not in '[(':
+def _fix_sequence(i: int, tokens: Tokens, n: int) -> None:
+    if tokens.original[i].src not in '[(':
         return  # not actually a braced sequence
-    remove_comma = tokens[i].src == '[' or n > 1
+    remove_comma = tokens.original[i].src == '[' or n > 1
     fix_brace(
         tokens,
         find_simple(i, tokens),
@@ -67,14 +63,14 @@ def _fix_sequence(i: int, tokens: list[Token], *, n: int) -> None:
 def visit_MatchMapping(
         state: State,
         node: ast.MatchMapping,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    yield ast_to_offset(node), _fix_mapping
+) -> Iterable[Callback]:
+    yield Callback(ast_to_offset(node), _fix_mapping)
 
 
 @register(ast.MatchSequence)
 def visit_MatchSequence(
         state: State,
         node: ast.MatchSequence,
-) -> Iterable[tuple[Offset, TokenFunc]]:
-    func = functools.partial(_fix_sequence, n=len(node.patterns))
-    yield ast_to_offset(node), func
+) -> Iterable[Callback]:
+    params = (len(node.patterns),)
+    yield Callback(ast_to_offset(node), _fix_sequence, params)
@@ -4,25 +4,24 @@ import ast
 import sys
 from collections.abc import Iterable
 
-from tokenize_rt import Offset
-from tokenize_rt import Token
-
 from add_trailing_comma._ast_helpers import ast_to_offset
+from add_trailing_comma._data import Callback
 from add_trailing_comma._data import register
 from add_trailing_comma._data import State
-from add_trailing_comma._data import TokenFunc
 from add_trailing_comma._token_helpers import find_simple
 from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import Tokens
 
 
 if sys.version_info >= (3, 12):  # pragma: >=3.12 cover
     def _fix_pep695(
         i: int,
-        tokens: list[Token],
+        tokens: Tokens,
     ) -> None:
-        for n in range(i, len(tokens)):
-            token = tokens[n]
+        for n in range(i, len(tokens.original)):
+            token = tokens.original[n]
             if token.name == 'OP' and token.src == '[':
+                tokens.scan('find_pep695', n, n - i + 1)
                 return fix_brace(
                     tokens,
                     find_simple(n, tokens),
@@ -35,9 +34,9 @@ if sys.version_info >= (3, 12):  # pragma: >=3.12 cover
     def visit_pep695(
         state: State,
         node: ast.TypeAlias | ast.ClassDef | ast.FunctionDef,
-    ) -> Iterable[tuple[Offset, TokenFunc]]:
+    ) -> Iterable[Callback]:
         if node.type_params:
-            yield ast_to_offset(node), _fix_pep695
+            yield Callback(ast_to_offset(node), _fix_pep695)
 
     register(ast.TypeAlias)(visit_pep695)
     register(ast.ClassDef)(visit_pep695)
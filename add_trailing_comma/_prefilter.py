@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import re
+
+# every rewrite is either of a bracket which spans lines or of a single line
+# bracket with whitespace / a comma before the closing bracket.  this checks
+# for neither on the raw bytes, erring on the side of "might change" for
+# anything it does not understand
+
+# anywhere, including strings and comments
+_BEFORE_CLOSE = re.compile(rb'[\s,][)\]}]')
+_INTERESTING = re.compile(rb'[()\[\]{}#\'"]')
+_NEWLINE = re.compile(rb'[\r\n]')
+_STRING_END = {
+    b"'": re.compile(rb"(?:[^'\\\r\n]|\\.)*'", re.DOTALL),
+    b'"': re.compile(rb'(?:[^"\\\r\n]|\\.)*"', re.DOTALL),
+    b"'''": re.compile(rb"(?:[^'\\]|\\.|'(?!''))*'''", re.DOTALL),
+    b'"""': re.compile(rb'(?:[^"\\]|\\.|"(?!""))*"""', re.DOTALL),
+}
+_FORMATTED_PREFIX = re.compile(rb'[fFtT]')
+_FIELD = re.compile(rb'[{}\'"\\\r\n#]')
+
+
+def _fields_ok(body: bytes) -> bool:
+    # since 3.12 the replacement fields of f-strings are tokenized as code
+    # and may contain the same quote -- in which case `body` ends early
+    depth = 0
+    quote = None
+    pos = 0
+    while True:
+        match = _FIELD.search(body, pos)
+        if match is None:
+            return depth == 0 and quote is None
+
+        c = match[0]
+        pos = match.end()
+        if quote is not None:
+            if c == quote:
+                quote = None
+            elif c not in b'{}#':
+                return False
+        elif depth == 0 and c in b'{}' and body[pos:pos + 1] == c:
+            pos += 1  # `{{` / `}}`
+        elif c == b'{':
+            depth += 1
+        elif c == b'}':
+            depth -= 1
+            if depth < 0:
+                return False
+        elif depth:
+            if c not in b'\'"' or body[pos:pos + 2] == c * 2:
+                return False
+            quote = c
+
+
+def unchanged(contents: bytes) -> bool:
+    if _BEFORE_CLOSE.search(contents):
+        return False
+
+    depth = 0
+    opened = pos = 0
+    while True:
+        match = _INTERESTING.search(contents, pos)
+        if match is None:
+            return depth == 0
+
+        c = match[0]
+        if c == b'#':
+            pos = contents.find(b'\n', match.end())
+            if pos == -1:
+                return depth == 0
+        elif c in b'\'"':
+            start = match.start()
+            quote = contents[start:start + 3]
+            if quote != c * 3:
+                quote = c
+            end = _STRING_END[quote].match(contents, start + len(quote))
+            if end is None:
+                return False
+            prefix = contents[max(start - 2, 0):start]
+            if _FORMATTED_PREFIX.search(prefix):
+                body = contents[start + len(quote):end.end() - len(quote)]
+                if not _fields_ok(body):
+                    return False
+            pos = end.end()
+        elif c in b'([{':
+            if depth == 0:
+                opened = match.start()
+            depth += 1
+            pos = match.end()
+        else:
+            depth -= 1
+            if depth < 0:
+                return False
+            elif depth == 0 and _NEWLINE.search(contents, opened, match.end()):
+                return False
+            pos = match.end()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import contextlib
+import sys
+import time
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterable
+from collections.abc import Mapping
+from types import FrameType
+from typing import Any
+
+# every run imports `timed`: the profilers import what they need themselves
+
+# phases of fixing a file in the order they happen.  within `fix` the
+# callbacks of each plugin (and the generic pass over all brackets) are timed
+# as `fix.<plugin>`.  the whole file is timed as `total`
+PHASES = ('parse', 'tokenize', 'visit', 'fix', 'render')
+
+Timings = dict[str, float]
+# `(line, utf8_byte_offset, tokens_scanned)` of an opening bracket
+Bracket = tuple[int, int, int]
+
+
+@contextlib.contextmanager
+def timed(
+        timings: Timings | None,
+        phase: str,
+) -> Generator[None, None, None]:
+    if timings is None:
+        yield
+    else:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[phase] = timings.get(phase, 0) + time.perf_counter() - t0
+
+
+def _totals(files: Mapping[str, Timings]) -> Timings:
+    ret: Timings = {}
+    for timings in files.values():
+        for phase, seconds in timings.items():
+            ret[phase] = ret.get(phase, 0) + seconds
+    return ret
+
+
+def _phases(totals: Timings) -> list[tuple[str, float]]:
+    plugins = sorted(
+        (k for k in totals if k.startswith('fix.')),
+        key=lambda k: -totals[k],
+    )
+    ret = []
+    for phase in PHASES:
+        ret.append((phase, totals.get(phase, 0)))
+        if phase == 'fix':
+            ret.extend((k, totals[k]) for k in plugins)
+    # reading, writing, caching, ...
+    other = totals.get('total', 0) - sum(v for k, v in ret if '.' not in k)
+    ret.append(('other', other))
+    return ret
+
+
+def slowest(files: Mapping[str, Timings], n: int) -> list[str]:
+    return sorted(files, key=lambda k: -files[k]['total'])[:n]
+
+
+def to_json(
+        files: Mapping[str, Timings],
+        top: int,
+        brackets: Mapping[str, list[Bracket]] | None = None,
+) -> dict[str, Any]:
+    brackets = brackets or {}
+    return {
+        'total': sum(timings['total'] for timings in files.values()),
+        'phases': dict(_phases(_totals(files))),
+        'slowest': [
+            {
+                'filename': filename,
+                **files[filename],
+                'brackets': [
+                    {'line': line, 'utf8_byte_offset': col, 'tokens': n}
+                    for line, col, n in brackets.get(filename, ())
+                ],
+            }
+            for filename in slowest(files, top)
+        ],
+        'files': files,
+    }
+
+
+def report(
+        files: Mapping[str, Timings],
+        top: int,
+        brackets: Mapping[str, list[Bracket]] | None = None,
+) -> str:
+    brackets = brackets or {}
+    total = sum(timings['total'] for timings in files.values())
+    lines = [f'{len(files)} files in {total:.3f}s', '']
+    lines.append(f'{"phase":<24}{"seconds":>10}{"%":>7}')
+    for phase, seconds in _phases(_totals(files)):
+        name = f'  {phase.partition(".")[2]}' if '.' in phase else phase
+        percent = seconds / total * 100 if total else 0
+        lines.append(f'{name:<24}{seconds:>10.3f}{percent:>7.1f}')
+    lines.append('')
+    lines.append(f'{"slowest files":<24}{"seconds":>10}')
+    for filename in slowest(files, top):
+        lines.append(f'{filename:<24}{files[filename]["total"]:>10.3f}')
+    if any(brackets.values()):
+        # tokens walked to find each bracket, points at quadratic constructs
+        lines.append('')
+        lines.append(f'{"expensive brackets":<24}{"tokens":>10}')
+        for filename, file_brackets in brackets.items():
+            for line, col, n in file_brackets:
+                lines.append(f'{f"{filename}:{line}:{col + 1}":<24}{n:>10}')
+    return '\n'.join(lines) + '\n'
+
+
+def _speedscope_profile(
+        name: str,
+        func: Callable[[], object],
+        frames: dict[tuple[str, str, int], int],
+        interval: float = .001,
+) -> dict[str, Any]:
+    # a sampled profile: a tracing one is far too large for big files
+    import threading
+
+    samples: list[list[int]] = []
+    weights: list[float] = []
+    thread_id = threading.get_ident()
+    done = threading.Event()
+
+    def _sample() -> None:
+        prev = time.perf_counter()
+        while not done.wait(interval):
+            frame: FrameType | None = sys._current_frames()[thread_id]
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                stack.append(frames.setdefault(key, len(frames)))
+                frame = frame.f_back
+            now = time.perf_counter()
+            samples.append(stack[::-1])
+            weights.append(now - prev)
+            prev = now
+
+    sampler = threading.Thread(target=_sample)
+    switch_interval = sys.getswitchinterval()
+    # otherwise the sampler waits up to 5ms for its turn
+    sys.setswitchinterval(interval)
+    t0 = time.perf_counter()
+    sampler.start()
+    try:
+        func()
+    finally:
+        done.set()
+        sampler.join()
+        sys.setswitchinterval(switch_interval)
+
+    return {
+        'type': 'sampled',
+        'name': name,
+        'unit': 'seconds',
+        'startValue': 0,
+        'endValue': time.perf_counter() - t0,
+        'samples': samples,
+        'weights': weights,
+    }
+
+
+def write_profile(
+        path: str,
+        funcs: Iterable[tuple[str, Callable[[], object]]],
+) -> None:
+    # `.json` is https://www.speedscope.app format, otherwise `pstats`
+    import cProfile
+    import json
+
+    if path.endswith('.json'):
+        frames: dict[tuple[str, str, int], int] = {}
+        profiles = [
+            _speedscope_profile(name, func, frames) for name, func in funcs
+        ]
+        contents = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {
+                'frames': [
+                    {'name': name, 'file': file, 'line': line}
+                    for name, file, line in frames
+                ],
+            },
+            'profiles': profiles,
+        }
+        with open(path, 'w') as f:
+            json.dump(contents, f)
+    else:
+        profiler = cProfile.Profile()
+        for _, func in funcs:
+            profiler.runcall(func)
+        profiler.dump_stats(path)
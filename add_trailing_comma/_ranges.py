@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import os.path
+import re
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
+
+# `@@ -a,b +c,d @@` -- the counts default to 1
+_HUNK_RE = re.compile(rb'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+# the escapes of a C-quoted path
+_ESCAPE_RE = re.compile(rb'\\([0-7]{3}|.)')
+_ESCAPES = {
+    b'a': b'\a', b'b': b'\b', b't': b'\t', b'n': b'\n', b'v': b'\v',
+    b'f': b'\f', b'r': b'\r',
+}
+
+
+class LineRanges:
+    # 1-indexed inclusive `(start, end)` line ranges, sorted and merged
+    def __init__(self, ranges: Iterable[tuple[int, int]]) -> None:
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        for start, end in sorted(ranges):
+            if self.ends and start <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def intersects(self, start: int, end: int) -> bool:
+        # the ranges are disjoint so only the last one starting before `end`
+        # can reach back to `start`
+        i = bisect.bisect_right(self.starts, end) - 1
+        return i >= 0 and self.ends[i] >= start
+
+
+class IntervalIndex:
+    # `(start, end, value)` intervals sorted by start, treated as a balanced
+    # binary tree (the middle of each slice is its root) where `_max_end`
+    # holds the largest end in each subtree
+    def __init__(self, intervals: Iterable[tuple[int, int, int]]) -> None:
+        self._intervals = sorted(intervals)
+        self._max_end = [0] * len(self._intervals)
+        self._build(0, len(self._intervals))
+
+    def _build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(
+            self._intervals[mid][1],
+            self._build(lo, mid),
+            self._build(mid + 1, hi),
+        )
+        return self._max_end[mid]
+
+    def overlapping(self, start: int, end: int) -> list[int]:
+        ret = []
+        todo = [(0, len(self._intervals))]
+        while todo:
+            lo, hi = todo.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < start:
+                continue
+            todo.append((lo, mid))
+            interval_start, interval_end, value = self._intervals[mid]
+            if interval_start <= end:
+                if interval_end >= start:
+                    ret.append(value)
+                todo.append((mid + 1, hi))
+        return ret
+
+
+def line_range(s: str) -> tuple[int, int]:
+    start_s, _, end_s = s.partition('-')
+    try:
+        start, end = int(start_s), int(end_s)
+    except ValueError:
+        start = end = 0
+    if not 1 <= start <= end:
+        raise argparse.ArgumentTypeError(
+            f'expected a line range START-END: {s!r}',
+        )
+    return start, end
+
+
+def _unescape(match: re.Match[bytes]) -> bytes:
+    c = match[1]
+    if len(c) == 3:
+        return bytes((int(c, 8),))
+    else:
+        return _ESCAPES.get(c, c)
+
+
+def _diff_path(s: bytes) -> str:
+    # git ends a path with a space in it with a tab, and quotes (C-style) a
+    # path with a quote, a backslash or a control character in it
+    s = s.removesuffix(b'\t')
+    if s.startswith(b'"'):
+        s = _ESCAPE_RE.sub(_unescape, s[1:-1])
+    return os.fsdecode(s.removeprefix(b'b/'))
+
+
+def parse_diff(diff: bytes) -> dict[str, LineRanges]:
+    ret: dict[str, list[tuple[int, int]]] = {}
+    ranges: list[tuple[int, int]] = []
+    for line in diff.splitlines():
+        if line.startswith(b'+++ '):
+            if line == b'+++ /dev/null':
+                ranges = []
+            else:
+                filename = _diff_path(line[len(b'+++ '):])
+                ranges = ret.setdefault(os.path.normpath(filename), [])
+        else:
+            match = _HUNK_RE.match(line)
+            if match is not None:
+                start = int(match[1])
+                count = 1 if match[2] is None else int(match[2])
+                if count:
+                    ranges.append((start, start + count - 1))
+                else:
+                    # a pure deletion: the lines around where it happened
+                    ranges.append((max(start, 1), start + 1))
+    return {k: LineRanges(v) for k, v in ret.items()}
+
+
+def git_changed_lines(
+        from_ref: str,
+        to_ref: str | None,
+        filenames: Sequence[str],
+) -> dict[str, LineRanges | None]:
+    # `None`: every line of a file which git does not track is new
+    import subprocess
+
+    if not filenames:
+        return {}
+
+    cmd: tuple[str, ...] = ('git', 'rev-parse', '--show-toplevel')
+    toplevel = os.fsdecode(subprocess.check_output(cmd).rstrip(b'\n'))
+    toplevel = os.path.realpath(toplevel)
+    # the diff names files relative to the top of the repository rather than
+    # the working directory, which leaves out files outside of it
+    cmd = (
+        'git', '-c', 'core.quotePath=false', 'diff', '--no-ext-diff',
+        '--no-color', '--no-renames', '--src-prefix=a/', '--dst-prefix=b/',
+        '-U0', from_ref, *((to_ref,) if to_ref else ()), '--', *filenames,
+    )
+    changed = parse_diff(subprocess.check_output(cmd))
+    tracked: set[str] = set()
+    if to_ref is None:
+        cmd = ('git', 'ls-files', '-z', '--full-name', '--', *filenames)
+        tracked = {
+            os.path.normpath(os.fsdecode(path))
+            for path in subprocess.check_output(cmd).split(b'\0') if path
+        }
+
+    ret: dict[str, LineRanges | None] = {}
+    for filename in filenames:
+        path = os.path.relpath(os.path.realpath(filename), toplevel)
+        if path in changed:
+            ret[filename] = changed[path]
+        elif to_ref is None and path not in tracked:
+            ret[filename] = None
+        else:
+            ret[filename] = LineRanges(())
+    return ret
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import bisect
+import collections
+import functools
+import math
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
 from typing import NamedTuple
 
 from tokenize_rt import ESCAPED_NL
 from tokenize_rt import NON_CODING_TOKENS
 from tokenize_rt import Offset
 from tokenize_rt import Token
+from tokenize_rt import tokens_to_src
 from tokenize_rt import UNIMPORTANT_WS
 
 NEWLINES = frozenset((ESCAPED_NL, 'NEWLINE', 'NL'))
@@ -21,63 +29,493 @@ class Fix(NamedTuple):
     initial_indent: int
 
 
-def find_simple(first_brace: int, tokens: list[Token]) -> Fix | None:
-    brace_stack = [first_brace]
-    multi_arg = False
+class Edit(NamedTuple):
+    start: int
+    end: int
+    src: str
+    plugins: tuple[str, ...]
 
-    for i in range(first_brace + 1, len(tokens)):
-        token = tokens[i]
-        if token.name == 'OP' and token.src in START_BRACES:
-            brace_stack.append(i)
-        elif token.name == 'OP' and token.src in END_BRACES:
-            brace_stack.pop()
 
-        if len(brace_stack) == 1 and token.src == ',':
-            multi_arg = True
+class Brace(NamedTuple):
+    close: int
+    commas: int
+    single_line: bool
 
-        if not brace_stack:
-            break
+
+class WouldChange(Exception):
+    # raised by the first edit when `Tokens.check` is set
+    pass
+
+
+# a position in the edited tokens: `(i, -1)` is the original token `i` and
+# `(i, n)` is the `n`th token inserted before it
+Cursor = tuple[int, int]
+
+
+def _token_offset(token: Token) -> Offset:
+    return token.offset
+
+
+def _with_position(token: Token, before: Token | None) -> Token:
+    # older versions of tokenize-rt give whitespace and escaped newlines no
+    # position, they start where the token before them ends
+    if before is None:
+        return token._replace(line=1, utf8_byte_offset=0)
+    assert before.line is not None and before.utf8_byte_offset is not None
+    newlines = before.src.count('\n')
+    if newlines:
+        last_line = before.src.rpartition('\n')[2]
+        line, offset = before.line + newlines, len(last_line.encode())
     else:
-        raise AssertionError('Past end?')
+        line = before.line
+        offset = before.utf8_byte_offset + len(before.src.encode())
+    return token._replace(line=line, utf8_byte_offset=offset)
+
+
+def _start(r: tuple[int, int]) -> int:
+    return r[0]
+
+
+@functools.cache
+def _indent_src(indent: int) -> str:
+    return ' ' * indent
+
+
+class _IndentTree:
+    # indentation of lines keyed by the index of their first token (`inf`
+    # where no line starts) supporting adding to and taking the minimum of a
+    # range of lines in `O(log n)` -- unhugging nested braces shifts the same
+    # lines once per level
+    def __init__(self, n: int, indents: dict[int, int]) -> None:
+        self.n = n
+        self.h = n.bit_length()
+        self.t: list[float] = [math.inf] * (2 * n)
+        self.d = [0] * n
+        for i, indent in indents.items():
+            self.t[n + i] = indent
+        for p in reversed(range(1, n)):
+            self.t[p] = min(self.t[2 * p], self.t[2 * p + 1])
+
+    def _apply(self, p: int, value: int) -> None:
+        self.t[p] += value
+        if p < self.n:
+            self.d[p] += value
+
+    def _build(self, p: int) -> None:
+        while p > 1:
+            p >>= 1
+            self.t[p] = min(self.t[2 * p], self.t[2 * p + 1]) + self.d[p]
+
+    def _push(self, p: int) -> None:
+        for s in range(self.h, 0, -1):
+            i = p >> s
+            if self.d[i]:
+                self._apply(2 * i, self.d[i])
+                self._apply(2 * i + 1, self.d[i])
+                self.d[i] = 0
+
+    def add(self, start: int, end: int, value: int) -> None:
+        lo, hi = start + self.n, end + self.n
+        while lo < hi:
+            if lo & 1:
+                self._apply(lo, value)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                self._apply(hi, value)
+            lo >>= 1
+            hi >>= 1
+        self._build(start + self.n)
+        self._build(end - 1 + self.n)
+
+    def min(self, start: int, end: int) -> float:
+        lo, hi = start + self.n, end + self.n
+        self._push(lo)
+        self._push(hi - 1)
+        ret = math.inf
+        while lo < hi:
+            if lo & 1:
+                ret = min(ret, self.t[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                ret = min(ret, self.t[hi])
+            lo >>= 1
+            hi >>= 1
+        return ret
+
+    def __getitem__(self, i: int) -> int:
+        return int(self.min(i, i + 1))
+
+    def __setitem__(self, i: int, indent: int) -> None:
+        self._push(i + self.n)
+        self.t[i + self.n] = indent
+        self._build(i + self.n)
+
+
+class Tokens:
+    def __init__(self, tokens: Iterable[Token] = ()) -> None:
+        # the tokens of the source, these are never changed.  edits are
+        # recorded against their indices (which never shift) and merged back
+        # in by `edited()`.  a plugin reads `original` to find tokens by their
+        # offset or to search for brackets (which are never inserted or
+        # removed), anything else is read through the edits with the cursors
+        # of `get()` / `next()` / `prev()`
+        original = list(tokens)
+        self.original: Sequence[Token] = original
+        self.inserted: dict[int, list[Token]] = {}
+        self.removed: set[int] = set()
+
+        self.braces: dict[int, Brace] = {}
+        # the single line braces which `find_simple` fixes, those with a comma
+        # or whitespace before the close: `f(a, )`.  other single line braces
+        # are never changed
+        self.single_line_fixes: set[int] = set()
+        # braces fixed by a plugin along with the rest of their literal, the
+        # generic pass skips these
+        self.swept: set[int] = set()
+        # when set, only the braces opened at these indices are fixed
+        self.in_ranges: set[int] | None = None
+        # the indentation of each line, keyed by the index of the first token
+        # after the newline.  lines inside of braces are reindented when
+        # unhugging so they are kept in `_lines` and rewritten in `edited()`
+        self.line_starts = [0]
+        self.indents = {0: 0}
+        self._line_indents: dict[int, int] = {}
+        # lines inside of braces without leading whitespace, these are given
+        # a whitespace token the first time they are reindented
+        self._unindented: list[int] = []
+        stack: list[list[int]] = []
+        last = len(self.original) - 1
+        for i, (name, src, line, _) in enumerate(original):
+            if line is None:
+                before = original[i - 1] if i else None
+                original[i] = _with_position(original[i], before)
+            if name == 'OP':
+                if src in START_BRACES:
+                    stack.append([i, 0])
+                elif src in END_BRACES:
+                    first, commas = stack.pop()
+                    single_line = self.original[first].line == line
+                    self.braces[first] = Brace(
+                        close=i,
+                        commas=commas,
+                        single_line=single_line,
+                    )
+                    before_close = self.original[i - 1]
+                    if single_line and (
+                            before_close.name == UNIMPORTANT_WS or
+                            before_close.src == ','
+                    ):
+                        self.single_line_fixes.add(first)
+                elif src == ',' and stack:
+                    stack[-1][1] += 1
+            elif name in NEWLINES and i < last:
+                self.line_starts.append(i + 1)
+                next_name, next_src, _, _ = self.original[i + 1]
+                if next_name in INDENT_TOKENS:
+                    indent = len(next_src)
+                else:
+                    indent = 0
+                if name == 'NL' and next_name != 'NL':
+                    self._line_indents[i + 1] = indent
+                    if next_name != UNIMPORTANT_WS:
+                        self._unindented.append(i + 1)
+                else:
+                    self.indents[i + 1] = indent
+
+        # lines whose indentation has been rewritten: `+1` / `-1` at the start
+        # and end of each reindented range, plus the lines which were set
+        self._reindented: dict[int, int] = collections.Counter()
+        self._reindented_lines: set[int] = set()
+        # `[start, end)` ranges of original indices which render differently
+        # and the name of the plugin which edited them
+        self._dirty: list[tuple[int, int, str]] = []
+        self.plugin = ''
+        # stop at the first edit (before making it), only `dirty` is kept
+        self.check = False
+        # work done, keyed by `(metric, plugin)` (see `_metrics`)
+        self.counts: collections.Counter[tuple[str, str]] = (
+            collections.Counter()
+        )
+        # tokens walked while searching, by the opening bracket they were
+        # walked for.  finds the construct behind a slow file
+        self.bracket_scans: collections.Counter[int] = collections.Counter()
+
+    @functools.cached_property
+    def _lines(self) -> _IndentTree:
+        # most files are never reindented, only build the tree when needed
+        return _IndentTree(len(self.original), self._line_indents)
+
+    def find_close(self, first_brace: int) -> tuple[int, Brace]:
+        brace = self.braces[first_brace]
+        return brace.close, brace
+
+    def fixable(self, first_brace: int) -> bool:
+        # whether `find_simple` can find a fix for the brace.  fixes only edit
+        # around the braces they fix so this does not change as they are made
+        brace = self.braces[first_brace]
+        return not brace.single_line or first_brace in self.single_line_fixes
+
+    def scan(self, helper: str, first_brace: int | None, n: int) -> None:
+        # `None` when no bracket was found, only the helper is counted
+        self.counts['tokens_scanned', helper] += n
+        if first_brace is not None:
+            self.bracket_scans[first_brace] += n
+
+    def find_offset(self, offset: Offset, lo: int = 0) -> int:
+        # the index of the first token at or after `offset`
+        return bisect.bisect_left(
+            self.original, offset, lo=lo, key=_token_offset,
+        )
+
+    def indent(self, i: int) -> int:
+        line_start = self.line_starts[bisect.bisect(self.line_starts, i) - 1]
+        if line_start in self.indents:
+            return self.indents[line_start]
+        elif '_lines' in self.__dict__:
+            return self._lines[line_start]
+        else:  # nothing has been reindented yet
+            return self._line_indents[line_start]
+
+    def set_indent(self, i: int, indent: int) -> None:
+        self._mark_dirty(i, i + 1)
+        pos = bisect.bisect_left(self.line_starts, i)
+        if pos == len(self.line_starts) or self.line_starts[pos] != i:
+            self.line_starts.insert(pos, i)
+        self._lines[i] = indent
+        self._reindented_lines.add(i)
+
+    def reindent(self, first_brace: int, last_brace: int, indent: int) -> None:
+        # shift the lines inside of the braces so the least indented one is
+        # at `indent`.  the line of the closing brace is included once it has
+        # been given whitespace
+        start, end = first_brace + 2, last_brace
+        if self.original[end - 1].name == 'NL' and self.inserted.get(end):
+            end += 1
+
+        lo = bisect.bisect_left(self._unindented, start)
+        hi = bisect.bisect_left(self._unindented, end)
+        for i in self._unindented[lo:hi]:
+            # the whitespace is filled in by `edited()`
+            self.insert_before((i, -1), [Token(UNIMPORTANT_WS, '')])
+        del self._unindented[lo:hi]
 
-    last_brace = i
+        # the lines are shifted in `O(log n)`, each is rewritten by `edited()`
+        lines = (
+            bisect.bisect_left(self.line_starts, end) -
+            bisect.bisect_left(self.line_starts, start)
+        )
+        self.scan('reindent', first_brace, lines)
+
+        min_indent = self._lines.min(start, end)
+        if min_indent != math.inf:
+            self._mark_dirty(start, end)
+            self._lines.add(start, end, indent - int(min_indent))
+            self._reindented[start] += 1
+            self._reindented[end] -= 1
+
+    def get(self, c: Cursor) -> Token:
+        i, n = c
+        return self.original[i] if n == -1 else self.inserted[i][n]
+
+    def next(self, c: Cursor) -> Cursor:
+        i, n = c
+        if n == -1:
+            i, n = i + 1, 0
+        else:
+            n += 1
+        while True:
+            if n < len(self.inserted.get(i, ())):
+                return i, n
+            elif i not in self.removed:
+                return i, -1
+            i, n = i + 1, 0
+
+    def prev(self, c: Cursor) -> Cursor:
+        i, n = c
+        if n == -1:
+            n = len(self.inserted.get(i, ()))
+        while True:
+            if n > 0:
+                return i, n - 1
+            i -= 1
+            if i not in self.removed:
+                return i, -1
+            n = len(self.inserted.get(i, ()))
+
+    def _mark_dirty(self, start: int, end: int) -> None:
+        self._dirty.append((start, end, self.plugin))
+        if self.check:
+            raise WouldChange
+
+    def insert_before(self, c: Cursor, tokens: list[Token]) -> None:
+        i, n = c
+        self._mark_dirty(i, i + 1)
+        inserted = self.inserted.setdefault(i, [])
+        if n == -1:
+            inserted.extend(tokens)
+        else:
+            inserted[n:n] = tokens
+        self.counts['tokens_inserted', self.plugin] += len(tokens)
+
+    def insert_after(self, c: Cursor, tokens: list[Token]) -> None:
+        i, n = c
+        if n == -1:
+            i += 1
+            self._mark_dirty(i, i + 1)
+            self.inserted.setdefault(i, [])[0:0] = tokens
+        else:
+            self._mark_dirty(i, i + 1)
+            self.inserted[i][n + 1:n + 1] = tokens
+        self.counts['tokens_inserted', self.plugin] += len(tokens)
+
+    def delete(self, start: Cursor, end: Cursor) -> None:
+        cursors = []
+        while start != end:
+            cursors.append(start)
+            start = self.next(start)
+        for i, n in reversed(cursors):
+            self._mark_dirty(i, i + 1)
+            if n == -1:
+                self.removed.add(i)
+            else:
+                del self.inserted[i][n]
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def _merged(self, start: int, end: int) -> Iterator[tuple[int, Token]]:
+        for i in range(start, end):
+            for inserted in self.inserted.get(i, ()):
+                yield i, inserted
+            if i not in self.removed:
+                yield i, self.original[i]
+
+    def _edited(
+            self,
+            start: int,
+            end: int,
+            reindented: list[tuple[int, int]],
+    ) -> Iterator[Token]:
+        # the reindented ranges are only applied here, once per line
+        after_nl = start > 0 and self.original[start - 1].name == 'NL'
+        for i, token in self._merged(start, end):
+            if after_nl and token.name != 'NL':
+                pos = bisect.bisect(reindented, i, key=_start) - 1
+                if reindented[pos][1] or i in self._reindented_lines:
+                    token = token._replace(src=_indent_src(self._lines[i]))
+            after_nl = token.name == 'NL'
+            yield token
+
+    def _offset(self, src: str, line_offsets: list[int], i: int) -> int:
+        if i == len(self.original):
+            return len(src)
+        token = self.original[i]
+        lineno, offset = token.line, token.utf8_byte_offset
+        assert lineno is not None and offset is not None
+        start = line_offsets[lineno - 1]
+        line = src[start:line_offsets[lineno]]
+        if line.isascii():
+            return start + offset
+        else:
+            return start + len(line.encode()[:offset].decode())
+
+    def edits(self, src: str) -> list[Edit]:
+        # `src` is the text these tokens came from, the edits are of `[start,
+        # end)` string offsets into it
+        ranges: list[tuple[int, int, set[str]]] = []
+        for start, end, plugin in sorted(self._dirty):
+            if ranges and start <= ranges[-1][1]:
+                prev_start, prev_end, plugins = ranges[-1]
+                ranges[-1] = (prev_start, max(prev_end, end), plugins)
+                plugins.add(plugin)
+            else:
+                ranges.append((start, end, {plugin}))
+
+        # how many reindented ranges cover each index, as `(start, count)`
+        reindented = [(-1, 0)]
+        for i, change in sorted(self._reindented.items()):
+            reindented.append((i, reindented[-1][1] + change))
+
+        line_offsets = [0]
+        for line in src.split('\n'):
+            line_offsets.append(line_offsets[-1] + len(line) + 1)
+
+        return [
+            Edit(
+                start=self._offset(src, line_offsets, start),
+                end=self._offset(src, line_offsets, end),
+                src=tokens_to_src(self._edited(start, end, reindented)),
+                plugins=tuple(sorted(plugins)),
+            )
+            for start, end, plugins in ranges
+        ]
+
+    def render(self, src: str) -> str:
+        # the text is reused outside of the edited ranges (and entirely if
+        # nothing was edited)
+        if not self._dirty:
+            return src
+        else:
+            return apply_edits(src, self.edits(src))
+
+
+def apply_edits(src: str, edits: Iterable[Edit]) -> str:
+    parts = []
+    prev = 0
+    for edit in edits:
+        parts.append(src[prev:edit.start])
+        parts.append(edit.src)
+        prev = edit.end
+    parts.append(src[prev:])
+    return ''.join(parts)
+
+
+def find_simple(first_brace: int, tokens: Tokens) -> Fix | None:
+    # the closing brace is looked up rather than searched for
+    tokens.scan('find_simple', first_brace, 1)
+    last_brace, brace = tokens.find_close(first_brace)
+    multi_arg = brace.commas > 0
 
     # Check if we're actually multi-line
+    before_close = tokens.get(tokens.prev((last_brace, -1)))
     if (
             # we were single line, but with an extra comma and or whitespace
-            tokens[first_brace].line == tokens[last_brace].line and (
-                tokens[last_brace - 1].name == UNIMPORTANT_WS or
-                tokens[last_brace - 1].src == ','
+            brace.single_line and (
+                before_close.name == UNIMPORTANT_WS or
+                before_close.src == ','
             )
     ):
         remove_comma = True
-    elif tokens[first_brace].line == tokens[last_brace].line:
+    elif brace.single_line:
         return None
     else:
         remove_comma = False
 
-    # determine the initial indentation
-    i = first_brace
-    while i >= 0 and tokens[i].name not in NEWLINES:
-        i -= 1
-
-    if i >= 0 and tokens[i + 1].name in INDENT_TOKENS:
-        initial_indent = len(tokens[i + 1].src)
-    else:
-        initial_indent = 0
-
     return Fix(
         (first_brace, last_brace),
         multi_arg=multi_arg,
         remove_comma=remove_comma,
-        initial_indent=initial_indent,
+        initial_indent=tokens.indent(first_brace),
     )
 
 
+def fix_generic(tokens: Tokens, fix_data: Fix | None) -> None:
+    # the pass over every bracket after its plugins: the hugging and the
+    # indentation are fixed but not the commas
+    plugin = tokens.plugin
+    tokens.plugin = 'braces'
+    tokens.counts['callbacks', 'braces'] += 1
+    fix_brace(tokens, fix_data, add_comma=False, remove_comma=False)
+    tokens.plugin = plugin
+
+
 def find_call(
         arg_offsets: set[Offset],
         i: int,
-        tokens: list[Token],
+        tokens: Tokens,
 ) -> Fix | None:
     # When we get a `call` object, the ast refers to it as this:
     #
@@ -91,27 +529,37 @@ def find_call(
     #     func_name(arg, arg, arg)
     #              ^ outer paren
     first_brace = None
+    first_arg = min(arg_offsets)
     paren_stack = []
-    for i in range(i, len(tokens)):
-        token = tokens[i]
+    start = i
+    skipped = 0
+    while i < len(tokens.original):
+        token = tokens.original[i]
+        # parenthesized groups which end before the arguments are skipped so
+        # a closing paren here was opened before `i`: the ast lies to us
+        # about the beginning of parenthesized functions.  See #3.
         if token.name == 'OP' and token.src == '(':
+            close, _ = tokens.find_close(i)
+            close_token = tokens.original[close]
+            if (close_token.line, close_token.utf8_byte_offset) < first_arg:
+                skipped += close - i
+                i = close + 1
+                continue
             paren_stack.append(i)
-        # the ast lies to us about the beginning of parenthesized functions.
-        # See #3. (why we make sure there's something to pop here)
-        elif token.name == 'OP' and token.src == ')' and paren_stack:
-            paren_stack.pop()
 
         if (token.line, token.utf8_byte_offset) in arg_offsets:
             first_brace = paren_stack[0]
             break
+        i += 1
     else:
         raise AssertionError('Past end?')
 
+    tokens.scan('find_call', first_brace, i - start + 1 - skipped)
     return find_simple(first_brace, tokens)
 
 
 def fix_brace(
-        tokens: list[Token],
+        tokens: Tokens,
         fix_data: Fix | None,
         add_comma: bool,
         remove_comma: bool,
@@ -119,26 +567,33 @@ def fix_brace(
     if fix_data is None:
         return
     first_brace, last_brace = fix_data.braces
+    if tokens.in_ranges is not None and first_brace not in tokens.in_ranges:
+        return
+    opening, closing = (first_brace, -1), (last_brace, -1)
+    commas = 0
+    edits = len(tokens._dirty)
 
     # Figure out if either of the braces are "hugging"
-    hug_open = tokens[first_brace + 1].name not in NON_CODING_TOKENS
-    hug_close = tokens[last_brace - 1].name not in NON_CODING_TOKENS
+    after_open = tokens.get(tokens.next(opening))
+    before_close = tokens.get(tokens.prev(closing))
+    hug_open = after_open.name not in NON_CODING_TOKENS
+    hug_close = before_close.name not in NON_CODING_TOKENS
     if (
             # Don't unhug single element things with a multi-line component
             # inside.
             not fix_data.multi_arg and
-            tokens[first_brace + 1].src in START_BRACES and
-            tokens[last_brace - 1].src in END_BRACES or
+            after_open.src in START_BRACES and
+            before_close.src in END_BRACES or
             # Don't unhug when containing a single token (such as a triple
             # quoted string).
-            first_brace + 2 == last_brace or
+            tokens.next(tokens.next(opening)) == closing or
             (
-                tokens[first_brace + 1].name == 'FSTRING_START' and
-                tokens[last_brace - 1].name == 'FSTRING_END'
+                after_open.name == 'FSTRING_START' and
+                before_close.name == 'FSTRING_END'
             ) or
             (
-                tokens[first_brace + 1].name == 'TSTRING_START' and
-                tokens[last_brace - 1].name == 'TSTRING_END'
+                after_open.name == 'TSTRING_START' and
+                before_close.name == 'TSTRING_END'
             ) or
             # don't unhug if it is a single line
             fix_data.remove_comma
@@ -147,70 +602,73 @@ def fix_brace(
 
     # fix open hugging
     if hug_open:
+        tokens.counts['braces_unhugged', tokens.plugin] += 1
         new_indent = fix_data.initial_indent + 4
 
-        tokens[first_brace + 1:first_brace + 1] = [
-            Token('NL', '\n'), Token(UNIMPORTANT_WS, ' ' * new_indent),
-        ]
-        last_brace += 2
+        tokens.insert_after(
+            opening,
+            [
+                Token('NL', '\n'),
+                Token(UNIMPORTANT_WS, _indent_src(new_indent)),
+            ],
+        )
+        tokens.set_indent(first_brace + 1, new_indent)
         # Adjust indentation for the rest of the things
-        min_indent = None
-        indents = []
-        insert_indents = []
-        for i in range(first_brace + 3, last_brace):
-            if tokens[i - 1].name == 'NL' and tokens[i].name != 'NL':
-                if tokens[i].name != UNIMPORTANT_WS:
-                    min_indent = 0
-                    insert_indents.append(i)
-                else:
-                    if min_indent is None:
-                        min_indent = len(tokens[i].src)
-                    elif len(tokens[i].src) < min_indent:
-                        min_indent = len(tokens[i].src)
-                    indents.append(i)
-
-        if indents:
-            assert min_indent is not None
-            for i in indents:
-                oldlen = len(tokens[i].src)
-                newlen = oldlen - min_indent + new_indent
-                tokens[i] = tokens[i]._replace(src=' ' * newlen)
-        for i in reversed(insert_indents):
-            tokens.insert(i, Token(UNIMPORTANT_WS, ' ' * new_indent))
-            last_brace += 1
+        tokens.reindent(first_brace, last_brace, new_indent)
 
     # fix close hugging
     if hug_close:
-        tokens[last_brace:last_brace] = [
-            Token('NL', '\n'),
-            Token(UNIMPORTANT_WS, ' ' * fix_data.initial_indent),
-        ]
-        last_brace += 2
+        tokens.counts['braces_unhugged', tokens.plugin] += 1
+        tokens.insert_before(
+            closing,
+            [
+                Token('NL', '\n'),
+                Token(UNIMPORTANT_WS, _indent_src(fix_data.initial_indent)),
+            ],
+        )
+        tokens.set_indent(last_brace, fix_data.initial_indent)
 
     # From there, we can walk backwards and decide whether a comma is needed
-    i = last_brace - 1
-    while tokens[i].name in NON_CODING_TOKENS:
-        i -= 1
+    c = tokens.prev(closing)
+    while tokens.get(c).name in NON_CODING_TOKENS:
+        c = tokens.prev(c)
 
     # If we're not a hugging paren, we can insert a comma
-    if add_comma and tokens[i].src != ',' and i + 1 != last_brace:
-        tokens.insert(i + 1, Token('OP', ','))
+    end = closing
+    if (
+            add_comma and
+            tokens.get(c).src != ',' and
+            tokens.next(c) != closing
+    ):
+        tokens.insert_after(c, [Token('OP', ',')])
+        tokens.counts['commas_added', tokens.plugin] += 1
+        commas += 1
+        # the checks below have always been relative to the token which was
+        # at the closing brace's position before the comma was inserted
+        end = tokens.prev(closing)
 
     # Fix trailing brace to match leading indentation
-    back_1 = tokens[last_brace - 1]
-    back_2 = tokens[last_brace - 2]
+    back_1 = tokens.prev(end)
+    back_2 = tokens.prev(back_1)
     if (
-            back_1.name == UNIMPORTANT_WS and
-            back_2.name == 'NL' and
-            len(back_1.src) != fix_data.initial_indent
+            tokens.get(back_1).name == UNIMPORTANT_WS and
+            tokens.get(back_2).name == 'NL' and
+            tokens.indent(back_1[0]) != fix_data.initial_indent
     ):
-        indent = fix_data.initial_indent * ' '
-        tokens[last_brace - 1] = back_1._replace(src=indent)
+        tokens.set_indent(back_1[0], fix_data.initial_indent)
 
     if fix_data.remove_comma:
-        start = last_brace
-        if tokens[start - 1].name == UNIMPORTANT_WS:
-            start -= 1
-        if remove_comma and tokens[start - 1].src == ',':
-            start -= 1
-        del tokens[start:last_brace]
+        start = end
+        if tokens.get(tokens.prev(start)).name == UNIMPORTANT_WS:
+            start = tokens.prev(start)
+        if remove_comma and tokens.get(tokens.prev(start)).src == ',':
+            start = tokens.prev(start)
+            tokens.counts['commas_removed', tokens.plugin] += 1
+            commas -= 1
+        tokens.delete(start, end)
+
+    brace = tokens.braces[first_brace]
+    tokens.braces[first_brace] = brace._replace(commas=brace.commas + commas)
+
+    if len(tokens._dirty) > edits:
+        tokens.counts['fixes', tokens.plugin] += 1
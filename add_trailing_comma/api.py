@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+from collections.abc import Iterator
+from typing import Any
+from typing import NamedTuple
+
+from add_trailing_comma import _prefilter
+from add_trailing_comma._core import fix_tokens
+from add_trailing_comma._token_helpers import apply_edits
+from add_trailing_comma._token_helpers import Edit
+
+__all__ = (
+    'Edit', 'Result', 'edits_json', 'fix_source', 'fix_source_edits',
+    'fix_sources',
+)
+
+
+class Result(NamedTuple):
+    src: str
+    changed: bool
+    # `[start, end)` offsets into the original text, in order
+    edits: tuple[Edit, ...]
+    # seconds
+    elapsed: float
+
+
+def _edits(contents_bytes: bytes, contents_text: str) -> tuple[Edit, ...]:
+    if _prefilter.unchanged(contents_bytes):
+        return ()
+    tokens = fix_tokens(contents_text)
+    if tokens is None:
+        return ()
+    else:
+        return tuple(tokens.edits(contents_text))
+
+
+# `bytes` are decoded as utf-8 (raising `UnicodeDecodeError` otherwise) and
+# source which does not parse is returned unchanged
+def fix_source(src: str | bytes) -> Result:
+    t0 = time.perf_counter()
+    if isinstance(src, bytes):
+        contents_bytes, contents_text = src, src.decode()
+    else:
+        contents_bytes, contents_text = src.encode(), src
+
+    edits = _edits(contents_bytes, contents_text)
+    return Result(
+        src=apply_edits(contents_text, edits),
+        changed=bool(edits),
+        edits=edits,
+        elapsed=time.perf_counter() - t0,
+    )
+
+
+def fix_sources(srcs: Iterable[str | bytes]) -> Iterator[Result]:
+    for src in srcs:
+        yield fix_source(src)
+
+
+# only the edits, the fixed source is never built
+def fix_source_edits(src: str | bytes) -> tuple[Edit, ...]:
+    if isinstance(src, bytes):
+        return _edits(src, src.decode())
+    else:
+        return _edits(src.encode(), src)
+
+
+# the edits with the lines (1-indexed) and columns (0-indexed, in characters)
+# they start and end at, and the text they replace
+def edits_json(src: str, edits: Iterable[Edit]) -> list[dict[str, Any]]:
+    ret = []
+    # newlines are only counted up to the last edit
+    pos, line, line_start = 0, 1, 0
+    for edit in edits:
+        positions = []
+        for offset in (edit.start, edit.end):
+            newlines = src.count('\n', pos, offset)
+            if newlines:
+                line += newlines
+                line_start = src.rindex('\n', pos, offset) + 1
+            pos = offset
+            positions.append((line, offset - line_start))
+        (start_line, start_col), (end_line, end_col) = positions
+        ret.append({
+            'start': edit.start,
+            'end': edit.end,
+            'start_line': start_line,
+            'start_col': start_col,
+            'end_line': end_line,
+            'end_col': end_col,
+            'old': src[edit.start:edit.end],
+            'new': edit.src,
+            'plugins': list(edit.plugins),
+        })
+    return ret
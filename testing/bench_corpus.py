@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from collections.abc import Sequence
+
+from tokenize_rt import src_to_tokens
+
+from add_trailing_comma._ast_helpers import ast_parse
+from add_trailing_comma._data import FUNCS
+from add_trailing_comma._data import visit
+from add_trailing_comma._main import _fix_src
+from add_trailing_comma._main import fix_file
+
+# every version of `fix_file` only looks at the attributes it knows about
+FIX_FILE_ARGS = argparse.Namespace(
+    exit_zero_even_if_changed=False,
+    cache_dir=[],
+    changed_lines=None,
+    check=False,
+    diff=False,
+    format=None,
+)
+
+
+def _flat_dict(rng: random.Random, n: int) -> str:
+    items = ''.join(
+        f'    {f"k{i}"!r}: {rng.randint(0, 1 << 16)},\n' for i in range(n)
+    )
+    # no trailing comma on the last item
+    return f'X = {{\n{items[:-2]}\n}}\n'
+
+
+def _nested_calls(rng: random.Random, n: int) -> str:
+    def _call(depth: int) -> str:
+        if depth == 0:
+            return str(rng.randint(0, 9))
+        indent = '    ' * depth
+        args = [_call(depth - 1) for _ in range(rng.randint(1, 2))]
+        return f'f{depth}({", ".join(args)},\n{indent}x)'
+    return ''.join(f'y{i} = {_call(6)}\n' for i in range(n // 32 + 1))
+
+
+def _method_chain(rng: random.Random, n: int) -> str:
+    def _chain(j: int) -> str:
+        # longer chains nest too deeply for the parser
+        links = ''.join(
+            f'    .m{i}(a, b={rng.randint(0, 9)})\n' if i % 3 else
+            f'    .m{i}(\n        a,\n        b\n    )\n'
+            for i in range(50)
+        )
+        return f'result{j} = (\n    obj\n{links})\n'
+    return ''.join(_chain(j) for j in range(n // 50 + 1))
+
+
+def _import_list(rng: random.Random, n: int) -> str:
+    names = ''.join(f'    name{i},\n' for i in range(n))
+    return f'from module import (\n{names[:-2]}\n)\n'
+
+
+def _pep695(rng: random.Random, n: int) -> str:
+    return ''.join(
+        f'def f{i}[\n    T,\n    U\n](a: T, b: U) -> T:\n    return a\n\n\n'
+        f'class C{i}[\n    T\n]:\n    pass\n\n\n'
+        f'type A{i}[\n    K,\n    V\n] = dict[K, V]\n\n\n'
+        for i in range(n // 8 + 1)
+    )
+
+
+def _match(rng: random.Random, n: int) -> str:
+    cases = ''.join(
+        f'    case Point(\n        x={i},\n        y=y\n    ):\n        pass\n'
+        f'    case {{\n        "k{i}": v,\n        "w": w\n    }}:\n'
+        f'        pass\n'
+        f'    case [\n        {i},\n        rest\n    ]:\n        pass\n'
+        for i in range(n // 8 + 1)
+    )
+    return f'match value:\n{cases}'
+
+
+def _expressions(rng: random.Random, n: int) -> str:
+    # many small nodes and few brackets, for the ast walk
+    return ''.join(
+        f'y{i} = [\n'
+        f'    a.b.c + d * (e - {rng.randint(0, 9)}) / f ** -g\n'
+        f'    for a in h if a and not (b or c) and d < e <= f\n'
+        f']\n'
+        f'z{i} = {{k: v for k, v in m.items() if k != "x{i}" and v}}\n'
+        for i in range(n // 4 + 1)
+    )
+
+
+def _clean(rng: random.Random, n: int) -> str:
+    return ''.join(
+        f'def g{i}(a, b, *, c={rng.randint(0, 9)}):\n'
+        f'    return h(\n        a,\n        [b, c],\n        {{"k": a}},\n'
+        f'    )\n\n\n'
+        for i in range(n // 4 + 1)
+    )
+
+
+GENERATORS: dict[str, Callable[[random.Random, int], str]] = {
+    'flat_dict': _flat_dict,
+    'nested_calls': _nested_calls,
+    'method_chain': _method_chain,
+    'import_list': _import_list,
+    'match': _match,
+    'expressions': _expressions,
+    'clean': _clean,
+}
+if sys.version_info >= (3, 12):
+    GENERATORS['pep695'] = _pep695
+
+
+def make_corpus(dest: str, files: int) -> list[str]:
+    rng = random.Random(0)
+    filenames = []
+    for name, generator in GENERATORS.items():
+        for i in range(files):
+            filename = os.path.join(dest, f'{name}_{i}.py')
+            with open(filename, 'w') as f:
+                f.write(generator(rng, rng.randint(100, 4000)))
+            filenames.append(filename)
+    return filenames
+
+
+def _best(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def run(corpus: str, repeat: int) -> dict[str, dict[str, float]]:
+    filenames = sorted(
+        os.path.join(corpus, filename) for filename in os.listdir(corpus)
+    )
+    srcs = []
+    for filename in filenames:
+        with open(filename) as f:
+            srcs.append(f.read())
+    n_bytes = sum(len(src.encode()) for src in srcs)
+    n_tokens = sum(len(src_to_tokens(src)) for src in srcs)
+    trees = [ast_parse(src) for src in srcs]
+
+    phases = {
+        'tokenize': lambda: [src_to_tokens(src) for src in srcs],
+        'parse': lambda: [ast_parse(src) for src in srcs],
+        'visit': lambda: [visit(FUNCS, tree) for tree in trees],
+        '_fix_src': lambda: [_fix_src(src) for src in srcs],
+    }
+    ret = {}
+    for phase, func in phases.items():
+        ret[phase] = {'seconds': _best(func, repeat)}
+
+    # files are rewritten so each repeat works on fresh copies
+    times = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            copies = [shutil.copy(filename, tmpdir) for filename in filenames]
+            t0 = time.perf_counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                for filename in copies:
+                    fix_file(filename, FIX_FILE_ARGS)
+            times.append(time.perf_counter() - t0)
+    ret['fix_file'] = {'seconds': min(times)}
+
+    for stats in ret.values():
+        stats['files/s'] = len(srcs) / stats['seconds']
+        stats['MB/s'] = n_bytes / stats['seconds'] / 1e6
+        stats['tokens/s'] = n_tokens / stats['seconds']
+    return ret
+
+
+def _print_table(results: dict[str, dict[str, dict[str, float]]]) -> None:
+    names = list(results)
+    phases = list(results[names[0]])
+    for metric in ('files/s', 'MB/s', 'tokens/s'):
+        header = ''.join(f'{name[-20:]:>22}' for name in names)
+        print(f'{metric:<10}{header}')
+        for phase in phases:
+            values = [results[name][phase][metric] for name in names]
+            cells = ''.join(f'{v:>22,.1f}' for v in values)
+            if len(names) > 1:
+                cells += f'  {values[-1] / values[0]:.2f}x'
+            print(f'  {phase:<8}{cells}')
+        print()
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--checkout', action='append', default=[],
+        help=(
+            'benchmark the add_trailing_comma in this directory instead of '
+            'the imported one.  given more than once the checkouts are '
+            'compared against the first'
+        ),
+    )
+    parser.add_argument('--files', type=int, default=5, help='per kind')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--max-regression', type=float, default=None, metavar='FRACTION',
+        help=(
+            'exit nonzero if a phase of the last checkout is this much slower '
+            'than the first'
+        ),
+    )
+    parser.add_argument('--corpus-dir', help='reuse (or create) this corpus')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus = args.corpus_dir or os.path.join(tmpdir, 'corpus')
+        if not os.path.exists(corpus):
+            os.makedirs(corpus)
+            make_corpus(corpus, args.files)
+
+        if not args.checkout:
+            results = {'current': run(corpus, args.repeat)}
+        else:
+            results = {}
+            for checkout in args.checkout:
+                cmd = (
+                    sys.executable, __file__, '--json',
+                    '--corpus-dir', corpus, '--repeat', str(args.repeat),
+                )
+                env = {**os.environ, 'PYTHONPATH': os.path.abspath(checkout)}
+                out = subprocess.check_output(cmd, env=env)
+                results[checkout] = json.loads(out)['current']
+
+    if args.json:
+        print(json.dumps(results))
+        return 0
+
+    _print_table(results)
+
+    if args.max_regression is not None and len(results) > 1:
+        first, *_, last = results.values()
+        for phase, stats in last.items():
+            ratio = stats['seconds'] / first[phase]['seconds']
+            if ratio > 1 + args.max_regression:
+                print(f'{phase} regressed: {ratio:.2f}x slower')
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import os.path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from collections.abc import Sequence
+
+from add_trailing_comma import _client
+
+SRC = '''\
+def f(
+        a,
+        b
+):
+    return g(
+        a,
+        b
+    )
+'''
+
+
+def _timings(func: Callable[[], object], n: int) -> str:
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    median = statistics.median(times) * 1000
+    p95 = times[int(len(times) * .95)] * 1000
+    return f'{median:>9.2f} {p95:>9.2f}'
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    cmd = (sys.executable, '-m', 'add_trailing_comma')
+    client_cmd = (sys.executable, '-m', 'add_trailing_comma._client')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sock = os.path.join(tmpdir, 'sock')
+        filename = os.path.join(tmpdir, 'f.py')
+
+        def _write_and(*run: str) -> Callable[[], object]:
+            def func() -> object:
+                with open(filename, 'w') as f:
+                    f.write(SRC)
+                stderr = subprocess.DEVNULL
+                return subprocess.run((*run, filename), stderr=stderr)
+            return func
+
+        proc = subprocess.Popen((*cmd, '--daemon', sock))
+        try:
+            while not os.path.exists(sock):
+                time.sleep(.01)
+
+            print(f'{"per request":<24} {"median ms":>9} {"p95 ms":>9}')
+            cold = _timings(_write_and(*cmd), args.n)
+            print(f'{"cold start":<24} {cold}')
+            client_run = _write_and(*client_cmd, '--connect', sock)
+            client = _timings(client_run, args.n)
+            print(f'{"client":<24} {client}')
+            direct = _timings(lambda: _client.fix(sock, SRC), args.n)
+            print(f'{"socket (warm client)":<24} {direct}')
+        finally:
+            proc.terminate()
+            proc.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
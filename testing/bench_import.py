@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import argparse
+import collections
+import statistics
+import subprocess
+import sys
+from collections.abc import Sequence
+
+
+def _importtime(module: str) -> dict[str, tuple[int, int]]:
+    # `import time: self [us] | cumulative | imported package`
+    cmd = (sys.executable, '-X', 'importtime', '-c', f'import {module}')
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    ret = {}
+    for line in out.stderr.splitlines():
+        _, _, rest = line.partition(':')
+        self_s, cumulative_s, name = rest.split('|')
+        if self_s.strip().isdigit():
+            ret[name.strip()] = (int(self_s), int(cumulative_s))
+    return ret
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='add_trailing_comma._main')
+    parser.add_argument('-n', type=int, default=20)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument(
+        # the entry point before any of the options took ~24ms
+        '--budget-ms', type=float, default=30,
+        help='exit nonzero if the median import takes longer than this',
+    )
+    args = parser.parse_args(argv)
+
+    self_times = collections.defaultdict(list)
+    totals = []
+    for _ in range(args.n):
+        times = _importtime(args.module)
+        totals.append(times[args.module][1] / 1000)
+        for name, (self_us, _) in times.items():
+            self_times[name].append(self_us / 1000)
+
+    print(f'{"self ms":>8}  module')
+    medians = {k: statistics.median(v) for k, v in self_times.items()}
+    for name, ms in sorted(medians.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f'{ms:>8.2f}  {name}')
+
+    total = statistics.median(totals)
+    print(f'import {args.module}: {total:.1f}ms (budget {args.budget_ms}ms)')
+    return total > args.budget_ms
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Sequence
+
+from add_trailing_comma._main import _cpu_count
+from add_trailing_comma._main import main
+
+SRC = '''\
+import os
+
+
+def f{n}(
+        a,
+        b
+):
+    return os.path.join(
+        a,
+        b
+    )
+
+
+x{n} = [
+    f{n}(1, 2), f{n}(3, 4),
+    {{'k': 1, 'v': (5, 6)}}
+]
+'''
+
+
+def _make_tree(root: str, files: int, reps: int) -> list[str]:
+    filenames = []
+    for i in range(files):
+        d = os.path.join(root, f'pkg{i % 64}')
+        os.makedirs(d, exist_ok=True)
+        filename = os.path.join(d, f'mod{i}.py')
+        with open(filename, 'w') as f:
+            f.write(''.join(SRC.format(n=n) for n in range(reps)))
+        filenames.append(filename)
+    return filenames
+
+
+def main_bench(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--reps', type=int, default=20)
+    parser.add_argument('--max-jobs', type=int, default=_cpu_count())
+    args = parser.parse_args(argv)
+
+    jobs_options = [1]
+    while jobs_options[-1] * 2 <= args.max_jobs:
+        jobs_options.append(jobs_options[-1] * 2)
+    if jobs_options[-1] != args.max_jobs:
+        jobs_options.append(args.max_jobs)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        template = os.path.join(tmpdir, 'template')
+        _make_tree(template, args.files, args.reps)
+
+        baseline = None
+        print(f'{"jobs":>5} {"seconds":>9} {"speedup":>8} {"efficiency":>10}')
+        for jobs in jobs_options:
+            tree = os.path.join(tmpdir, f'tree{jobs}')
+            shutil.copytree(template, tree)
+            filenames = sorted(
+                os.path.join(dirpath, filename)
+                for dirpath, _, filenames in os.walk(tree)
+                for filename in filenames
+            )
+
+            t0 = time.perf_counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                main((*filenames, f'--jobs={jobs}'))
+            elapsed = time.perf_counter() - t0
+
+            baseline = baseline or elapsed
+            speedup = baseline / elapsed
+            print(
+                f'{jobs:>5} {elapsed:>9.3f} {speedup:>7.2f}x '
+                f'{speedup / jobs:>10.0%}',
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main_bench())
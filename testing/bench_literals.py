@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+from collections.abc import Sequence
+from typing import Any
+
+from add_trailing_comma._core import fix_tokens
+from add_trailing_comma._profile import PHASES
+from add_trailing_comma._profile import timed
+from add_trailing_comma._profile import Timings
+
+
+def _value(rng: random.Random, depth: int) -> Any:
+    r = rng.random()
+    if depth > 3 or r < .5:
+        return rng.choice((
+            rng.randint(-1000, 1000),
+            rng.random(),
+            f's{rng.randint(0, 99999)}',
+            True,
+            None,
+        ))
+    elif r < .75:
+        return [_value(rng, depth + 1) for _ in range(rng.randint(0, 6))]
+    else:
+        return {
+            f'k{i}': _value(rng, depth + 1)
+            for i in range(rng.randint(0, 6))
+        }
+
+
+def _src(megabytes: float) -> str:
+    rng = random.Random(0)
+    records = []
+    size = 0
+    while size < megabytes * 1e6:
+        record = {f'k{i}': _value(rng, 1) for i in range(8)}
+        record_src = json.dumps(record, indent=4)
+        # each line of a record is indented once more in the list
+        size += len(record_src) + 4 * (record_src.count('\n') + 1) + 2
+        records.append(record)
+    # as `json.dump` writes it: every bracket on its own line without a
+    # trailing comma, so every one of them is rewritten
+    data = json.dumps(records, indent=4)
+    spellings = {'true': 'True', 'false': 'False', 'null': 'None'}
+    data = re.sub(r'\b(true|false|null)\b', lambda m: spellings[m[1]], data)
+    return f'DATA = {data}\n'
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=float, default=50)
+    args = parser.parse_args(argv)
+
+    src = _src(args.megabytes)
+    print(f'{len(src.encode()) / 1e6:.1f} MB of literals')
+
+    timings: Timings = {}
+    t0 = time.perf_counter()
+    tokens = fix_tokens(src, timings=timings)
+    total = time.perf_counter() - t0
+    assert tokens is not None
+    with timed(timings, 'render'):
+        tokens.render(src)
+
+    for phase in PHASES:
+        print(f'{phase:<10}{timings.get(phase, 0):>8.3f}s')
+    print(f'{"total":<10}{total + timings["render"]:>8.3f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
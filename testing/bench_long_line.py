@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import argparse
+import time
+from collections.abc import Sequence
+
+from tokenize_rt import src_to_tokens
+
+from add_trailing_comma._main import _fix_src
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    # every `(n, )` is rewritten so each looks up its indentation
+    tuples = args.tokens // 7
+    src = f'x = [{", ".join(f"({i}, )" for i in range(tuples))}]\n'
+    print(f'{len(src_to_tokens(src))} tokens on a single line')
+
+    t0 = time.perf_counter()
+    _fix_src(src)
+    print(f'_fix_src: {time.perf_counter() - t0:.3f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
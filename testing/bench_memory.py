@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import argparse
+import random
+import tracemalloc
+from collections.abc import Sequence
+
+from add_trailing_comma._ast_helpers import ast_parse
+from add_trailing_comma._core import fix_tokens
+from add_trailing_comma._data import FUNCS
+from add_trailing_comma._data import visit
+from testing.bench_corpus import GENERATORS
+
+
+def _src(megabytes: float) -> str:
+    rng = random.Random(0)
+    parts = []
+    size = 0
+    while size < megabytes * 1e6:
+        # every kind of node with a callback
+        for generator in GENERATORS.values():
+            part = generator(rng, 1000)
+            parts.append(part)
+            size += len(part)
+    return ''.join(parts)
+
+
+def _mb(n: int) -> str:
+    return f'{n / 1e6:>10.1f} MB'
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=float, default=2)
+    args = parser.parse_args(argv)
+
+    src = _src(args.megabytes)
+    print(f'{len(src.encode()) / 1e6:.1f} MB of source')
+
+    tracemalloc.start()
+
+    tree = ast_parse(src)
+    tree_size, parse_peak = tracemalloc.get_traced_memory()
+
+    callbacks = visit(FUNCS, tree)
+    callbacks_size = tracemalloc.get_traced_memory()[0] - tree_size
+    del tree, callbacks
+
+    tracemalloc.reset_peak()
+    fix_tokens(src)
+    _, fix_tokens_peak = tracemalloc.get_traced_memory()
+
+    print(f'{"parse peak":<20}{_mb(parse_peak)}')
+    print(f'{"ast":<20}{_mb(tree_size)}')
+    print(f'{"callbacks":<20}{_mb(callbacks_size)}')
+    print(f'{"fix_tokens peak":<20}{_mb(fix_tokens_peak)}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
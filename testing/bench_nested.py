@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import argparse
+import time
+from collections.abc import Sequence
+
+from add_trailing_comma._main import _fix_src
+
+
+def _src(depth: int, lines: int) -> str:
+    # every level hugs its opening brace so unhugging it reindents all of the
+    # lines inside of it
+    body = ''.join(f'    {i},\n' for i in range(lines))
+    return f'x = {"f(0, " * depth}\n{body}{")" * depth}\n'
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-depth', type=int, default=128)
+    parser.add_argument('--lines', type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    depth = 1
+    while depth <= args.max_depth:
+        src = _src(depth, args.lines)
+        t0 = time.perf_counter()
+        _fix_src(src)
+        elapsed = time.perf_counter() - t0
+        print(f'depth {depth:>4}: {elapsed:.3f}s')
+        depth *= 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import argparse
+import os.path
+import time
+from collections.abc import Sequence
+
+from add_trailing_comma._main import _fix
+from add_trailing_comma._prefilter import unchanged
+
+
+def _files(paths: Sequence[str]) -> list[str]:
+    ret: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                ret.extend(
+                    os.path.join(dirpath, filename)
+                    for filename in filenames
+                    if filename.endswith('.py')
+                )
+        else:
+            ret.append(path)
+    return sorted(ret)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    files = cleared = clean = 0
+    prefilter_time = fix_time = 0.
+    wrong = []
+    for filename in _files(args.paths):
+        with open(filename, 'rb') as f:
+            contents_bytes = f.read()
+        try:
+            contents_text = contents_bytes.decode()
+        except UnicodeDecodeError:
+            continue
+        files += 1
+
+        t0 = time.perf_counter()
+        is_unchanged = unchanged(contents_bytes)
+        t1 = time.perf_counter()
+        _, changed = _fix(contents_text)
+        t2 = time.perf_counter()
+
+        prefilter_time += t1 - t0
+        fix_time += t2 - t1
+        clean += not changed
+        cleared += is_unchanged
+        if is_unchanged and changed:
+            wrong.append(filename)
+
+    print(f'{files} files, {clean} unchanged by _fix')
+    rate = cleared / max(clean, 1)
+    print(f'cleared by the prefilter: {cleared} ({rate:.1%})')
+    print(f'prefilter: {prefilter_time:.3f}s, _fix: {fix_time:.3f}s')
+    for filename in wrong:
+        print(f'cleared but changed: {filename}')
+    return bool(wrong)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from add_trailing_comma.api import Edit
+from add_trailing_comma.api import edits_json
+from add_trailing_comma.api import fix_source
+from add_trailing_comma.api import fix_source_edits
+from add_trailing_comma.api import fix_sources
+
+
+@pytest.mark.parametrize('src', ('x = 5\n', 'x = f(1, 2)\n', 'x = (\n'))
+def test_fix_source_noop(src):
+    result = fix_source(src)
+    assert result.src == src
+    assert result.changed is False
+    assert result.edits == ()
+    assert result.elapsed >= 0
+
+
+def test_fix_source():
+    src = 'x = f(\n    1\n)\ny = [\n    2\n]\nz = (1, 2,)\n'
+    result = fix_source(src)
+    assert result.src == 'x = f(\n    1,\n)\ny = [\n    2,\n]\nz = (1, 2)\n'
+    assert result.changed is True
+    assert result.edits == (
+        Edit(start=12, end=13, src=',\n', plugins=('calls',)),
+        Edit(start=26, end=27, src=',\n', plugins=('literals',)),
+        Edit(start=38, end=39, src='', plugins=('literals',)),
+    )
+    for edit in result.edits:
+        assert src[edit.start:edit.end] != edit.src
+
+
+def test_fix_source_unhug():
+    result = fix_source('f(a,\n  b)\n')
+    assert result.src == 'f(\n    a,\n    b,\n)\n'
+    edit, = result.edits
+    assert (edit.start, edit.end) == (2, 9)
+    assert edit.plugins == ('calls',)
+
+
+def test_fix_source_overlapping_edits_are_merged():
+    result = fix_source('f(\n    [a,\n     b])\n')
+    assert result.src == 'f(\n    [\n        a,\n        b,\n    ],\n)\n'
+    edit, = result.edits
+    assert edit.plugins == ('calls', 'literals')
+
+
+def test_fix_source_bytes():
+    result = fix_source('x = [\n    "☃"\n]\n'.encode())
+    assert result.src == 'x = [\n    "☃",\n]\n'
+    edit, = result.edits
+    assert result.src[edit.start:edit.start + len(edit.src)] == edit.src
+
+
+def test_fix_source_bytes_non_utf8():
+    with pytest.raises(UnicodeDecodeError):
+        fix_source('x = €\n'.encode('cp1252'))
+
+
+def test_fix_sources_is_lazy():
+    srcs = itertools.cycle(('x(\n    1\n)\n', 'x = 5\n'))
+    results = list(itertools.islice(fix_sources(srcs), 3))
+    assert [result.changed for result in results] == [True, False, True]
+
+
+def test_fix_sources_empty():
+    assert list(fix_sources(())) == []
+
+
+@pytest.mark.parametrize(
+    'src',
+    ('x = 5\n', 'x = (\n', 'f(a,\n  b)\ny = [\n    1\n]\n'),
+)
+def test_fix_source_edits(src):
+    assert fix_source_edits(src) == fix_source(src).edits
+    assert fix_source_edits(src.encode()) == fix_source(src).edits
+
+
+def test_edits_json():
+    src = 'f(a,\n  b)\ny = [\n    "☃"\n]\n'
+    assert edits_json(src, fix_source_edits(src)) == [
+        {
+            'start': 2, 'end': 9,
+            'start_line': 1, 'start_col': 2, 'end_line': 2, 'end_col': 4,
+            'old': 'a,\n  b)',
+            'new': '\n    a,\n    b,\n)',
+            'plugins': ['calls'],
+        },
+        {
+            # columns are in characters rather than bytes
+            'start': 23, 'end': 24,
+            'start_line': 4, 'start_col': 7, 'end_line': 5, 'end_col': 0,
+            'old': '\n',
+            'new': ',\n',
+            'plugins': ['literals'],
+        },
+    ]
+
+
+def test_edits_json_empty():
+    assert edits_json('x = 5\n', ()) == []
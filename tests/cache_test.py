@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+from unittest import mock
+
+from add_trailing_comma import _cache
+
+
+def test_key_depends_on_contents():
+    assert _cache.key(b'x = 5\n') == _cache.key(b'x = 5\n')
+    assert _cache.key(b'x = 5\n') != _cache.key(b'x = 6\n')
+
+
+def test_get_missing(tmpdir):
+    assert _cache.get([tmpdir.strpath], 'abcd', 'x = 5\n') is None
+
+
+def test_put_get_clean(tmpdir):
+    _cache.put([tmpdir.strpath], 'abcd', 'x = 5\n', False)
+    ret = _cache.get([tmpdir.strpath], 'abcd', 'x = 5\n')
+    assert ret == ('x = 5\n', False)
+
+
+def test_put_get_fixed(tmpdir):
+    _cache.put([tmpdir.strpath], 'abcd', 'x(\n    1,\n)\n', True)
+    ret = _cache.get([tmpdir.strpath], 'abcd', 'x(\n    1\n)\n')
+    assert ret == ('x(\n    1,\n)\n', True)
+
+
+def test_get_searches_all_directories(tmpdir):
+    local, shared = tmpdir.join('local').strpath, tmpdir.join('shared').strpath
+    _cache.put([shared], 'abcd', 'x = 5\n', False)
+    assert _cache.get([local, shared], 'abcd', 'x = 5\n') == ('x = 5\n', False)
+
+
+def test_get_ignores_corrupt_entries(tmpdir):
+    tmpdir.join('ab').ensure_dir().join('abcd').write('garbage')
+    assert _cache.get([tmpdir.strpath], 'abcd', 'x = 5\n') is None
+
+
+def test_read_only_cache(tmpdir):
+    _cache.put([tmpdir.strpath], 'abcd', 'x = 5\n', False)
+    with (
+            mock.patch.object(os, 'utime', side_effect=PermissionError),
+            mock.patch.object(os, 'replace', side_effect=PermissionError),
+    ):
+        _cache.put([tmpdir.strpath], 'abef', 'x = 5\n', False)
+        ret = _cache.get([tmpdir.strpath], 'abcd', 'x = 5\n')
+        assert ret == ('x = 5\n', False)
+    assert _cache.get([tmpdir.strpath], 'abef', 'x = 5\n') is None
+
+
+def test_put_ignores_write_errors(tmpdir):
+    tmpdir.join('ab').write('not a directory')
+    _cache.put([tmpdir.strpath], 'abcd', 'x = 5\n', False)
+    assert _cache.get([tmpdir.strpath], 'abcd', 'x = 5\n') is None
+
+
+def _usage(tmpdir, k):
+    return _cache._usage(os.stat(tmpdir.join(k[:2], k).strpath))
+
+
+def test_evict_oldest_first(tmpdir):
+    for i in range(5):
+        k = f'aa0{i}'
+        _cache.put([tmpdir.strpath], k, f'x = {i}\n', True)
+        os.utime(tmpdir.join('aa', k).strpath, (i, i))
+
+    # measured by disk usage, a small entry takes a whole block
+    usage = _usage(tmpdir, 'aa01')
+    assert usage >= len('+x = 0\n')
+    # down to 3/4 of the limit
+    _cache.evict(tmpdir.strpath, 4 * usage)
+
+    assert sorted(os.listdir(tmpdir.join('aa'))) == ['aa02', 'aa03', 'aa04']
+    assert tmpdir.join('.size').read() == f'{3 * usage}\n'
+    assert not tmpdir.join('.added').exists()
+
+
+def test_evict_walks_once_the_cache_is_full(tmpdir):
+    _cache.put([tmpdir.strpath], 'aa00', 'x = 0\n', True)
+    usage = _usage(tmpdir, 'aa00')
+    _cache.evict(tmpdir.strpath, 4 * usage)
+    assert tmpdir.join('.size').read() == f'{usage}\n'
+
+    for i in range(1, 4):
+        _cache.put([tmpdir.strpath], f'aa0{i}', f'x = {i}\n', True)
+    assert tmpdir.join('.added').read() == f'{usage}\n' * 3
+    # the entries added since the last walk still fit
+    with mock.patch.object(os, 'walk', side_effect=AssertionError):
+        _cache.evict(tmpdir.strpath, 4 * usage)
+
+    _cache.put([tmpdir.strpath], 'aa04', 'x = 4\n', True)
+    _cache.evict(tmpdir.strpath, 4 * usage)
+    assert len(os.listdir(tmpdir.join('aa'))) == 3
+    assert tmpdir.join('.size').read() == f'{3 * usage}\n'
+
+
+def test_evict_walks_without_an_estimate(tmpdir):
+    _cache.put([tmpdir.strpath], 'aa01', 'x = 1\n', True)
+    usage = _usage(tmpdir, 'aa01')
+    tmpdir.join('.size').write('0\n')
+    tmpdir.join('.added').write('garbage\n')
+    _cache.evict(tmpdir.strpath, 2 * usage)
+    assert tmpdir.join('.size').read() == f'{usage}\n'
+
+    tmpdir.join('.size').write('garbage\n')
+    _cache.evict(tmpdir.strpath, 2 * usage)
+    assert tmpdir.join('.size').read() == f'{usage}\n'
+
+
+def test_evict_missing_cache_dir(tmpdir):
+    _cache.evict(tmpdir.join('missing').strpath, 0)
+    assert not tmpdir.join('missing').exists()
+
+
+def test_evict_read_only_cache(tmpdir):
+    _cache.put([tmpdir.strpath], 'aa01', 'x = 1\n', True)
+    with (
+            mock.patch.object(os, 'access', return_value=False),
+            mock.patch.object(os, 'walk', side_effect=AssertionError),
+    ):
+        _cache.evict(tmpdir.strpath, 0)
+    assert os.listdir(tmpdir.join('aa')) == ['aa01']
+
+
+def test_evict_ignores_remove_errors(tmpdir):
+    _cache.put([tmpdir.strpath], 'aa01', 'x = 6\n', True)
+    with mock.patch.object(os, 'remove', side_effect=PermissionError):
+        _cache.evict(tmpdir.strpath, 0)
+    assert os.listdir(tmpdir.join('aa')) == ['aa01']
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import collections
+
+import pytest
+from tokenize_rt import Offset
+from tokenize_rt import src_to_tokens
+
+from add_trailing_comma import _core
+from add_trailing_comma._data import Callbacks
+from add_trailing_comma._metrics import Counts
+from add_trailing_comma._token_helpers import Tokens
+
+
+def test_callback_indices():
+    tokens = Tokens(src_to_tokens('if x:\n    pass\nf(1)\n'))
+    callbacks = Callbacks()
+    for line, col in ((3, 3), (2, 1), (3, 0), (9, 0), (3, 0)):
+        callbacks.append(Offset(line, col), lambda i, tokens: None)
+    # in order, the `DEDENT` before `f` is skipped, the rest are not tokens
+    assert list(_core._callback_indices(tokens, callbacks)) == [
+        (9, 2), (9, 4), (12, 0),
+    ]
+
+
+def test_fix_tokens_counts():
+    counts: Counts = collections.Counter()
+    tokens = _core.fix_tokens('f(a,\n  b)\nx = [1, 2,]\n', counts=counts)
+    assert tokens is not None
+    assert counts == {
+        ('files_parsed', ''): 1,
+        ('callbacks', 'calls'): 1,
+        ('callbacks', 'literals'): 1,
+        ('callbacks', 'braces'): 2,
+        ('fixes', 'calls'): 1,
+        ('fixes', 'literals'): 1,
+        ('commas_added', 'calls'): 1,
+        ('commas_removed', 'literals'): 1,
+        ('braces_unhugged', 'calls'): 2,
+        ('tokens_inserted', 'calls'): 5,
+        ('tokens_scanned', 'find_call'): 2,
+        ('tokens_scanned', 'find_simple'): 3,
+        ('tokens_scanned', 'reindent'): 1,
+    }
+
+
+def test_fix_tokens_skips_single_line_brackets():
+    counts: Counts = collections.Counter()
+    src = 'f(a, [b])\nx = (y, 2, )\n'
+    tokens = _core.fix_tokens(src, counts=counts)
+    assert tokens is not None
+    # only the brackets of the tuple could be changed
+    assert counts['callbacks', 'calls'] == 0
+    assert counts['callbacks', 'literals'] == 1
+    assert counts['callbacks', 'braces'] == 1
+    assert tokens.render(src) == 'f(a, [b])\nx = (y, 2)\n'
+
+
+def test_fix_tokens_counts_syntax_error():
+    counts: Counts = collections.Counter()
+    assert _core.fix_tokens('x = (\n', counts=counts) is None
+    assert counts == {('files_syntax_error', ''): 1}
+
+
+@pytest.mark.parametrize(
+    ('src', 'helper'),
+    (
+        ('from a import \\\n    b\n', 'find_import'),
+        ('x = \\\n    1, 2\n', 'find_tuple'),
+    ),
+)
+def test_fix_tokens_scans_without_a_bracket(src, helper):
+    tokens = _core.fix_tokens(src)
+    assert tokens is not None
+    assert tokens.counts['tokens_scanned', helper] > 0
+    # only the brackets are reported as expensive
+    assert tokens.bracket_scans == {}
+
+
+def test_fix_tokens_check():
+    tokens = _core.fix_tokens('f(a,\n  b)\nx = [1, 2,]\n', check=True)
+    assert tokens is not None
+    assert tokens.dirty
+    # stopped before making the first edit
+    assert not tokens.inserted
+    assert tokens.counts['callbacks', 'literals'] == 0
+
+
+def test_fix_tokens_check_unchanged():
+    tokens = _core.fix_tokens('f(a, b)\n', check=True)
+    assert tokens is not None
+    assert not tokens.dirty
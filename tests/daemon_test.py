@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import io
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from add_trailing_comma import _client
+from add_trailing_comma import _daemon
+from add_trailing_comma import _main
+from add_trailing_comma._main import main
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    path = tmpdir.join('sock').strpath
+    with _daemon.Server(path, jobs=2, idle_timeout=60) as server:
+        thread = threading.Thread(target=server.serve_forever, args=(.01,))
+        thread.start()
+        try:
+            yield path
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+def _request(path, line):
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.sendall(line)
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def test_daemon_fix(daemon):
+    ret = _client.fix(daemon, 'x(\n    1\n)\n')
+    assert ret == ('x(\n    1,\n)\n', True)
+
+
+def test_daemon_response(daemon):
+    response = _request(daemon, b'{"src": "x = (1, 2,)\\n"}\n')
+    assert response['src'] == 'x = (1, 2)\n'
+    assert response['changed'] is True
+    assert response['edits'] == [
+        {'start': 9, 'end': 10, 'src': '', 'plugins': ['literals']},
+    ]
+
+
+def test_daemon_concurrent_requests(daemon):
+    lock = threading.Lock()
+    active = []
+    max_active = 0
+
+    def _response(line):
+        nonlocal max_active
+        with lock:
+            active.append(line)
+            max_active = max(max_active, len(active))
+        time.sleep(.01)
+        with lock:
+            active.remove(line)
+        return orig_response(line)
+
+    results: list[tuple[str, bool] | None] = [None] * 8
+
+    def _fix(i):
+        results[i] = _client.fix(daemon, f'x{i}(\n    1\n)\n')
+
+    orig_response = _daemon._response
+    threads = [threading.Thread(target=_fix, args=(i,)) for i in range(8)]
+    with mock.patch.object(_daemon, '_response', _response):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert results == [(f'x{i}(\n    1,\n)\n', True) for i in range(8)]
+    # the daemon is limited to 2 concurrent requests
+    assert max_active <= 2
+
+
+@pytest.mark.parametrize(
+    ('line', 'expected'),
+    (
+        (b'garbage\n', 'invalid json: '),
+        (b'[]\n', 'expected {"src": str}'),
+        (b'{"src": 1}\n', 'expected {"src": str}'),
+    ),
+)
+def test_daemon_invalid_request(daemon, line, expected):
+    response = _request(daemon, line)
+    assert response['error'].startswith(expected)
+
+
+def test_daemon_fix_error(daemon):
+    # a lone surrogate cannot be encoded to be parsed
+    response = _request(daemon, b'{"src": "\\ud800"}\n')
+    assert response['error'].startswith('UnicodeEncodeError: ')
+
+
+def test_daemon_ignores_empty_connection():
+    request, peer = socket.socketpair()
+    peer.close()
+    with request:
+        # writing a response would fail with `BrokenPipeError`
+        _daemon._Handler(request, '', mock.Mock())
+
+
+def test_serve_exits_when_idle(tmpdir):
+    path = tmpdir.join('sock')
+    assert _daemon.serve(path.strpath, jobs=1, idle_timeout=.01) == 0
+    assert not path.exists()
+
+
+def test_serve_replaces_stale_socket(tmpdir):
+    path = tmpdir.join('sock')
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.bind(path.strpath)
+    assert _daemon.serve(path.strpath, jobs=1, idle_timeout=.01) == 0
+    assert not path.exists()
+
+
+def test_serve_does_not_remove_other_files(tmpdir, capsys):
+    path = tmpdir.join('sock')
+    path.write('x = 5\n')
+    assert _daemon.serve(path.strpath, jobs=1, idle_timeout=.01) == 1
+    assert path.read() == 'x = 5\n'
+    _, err = capsys.readouterr()
+    assert err == f'{path}: exists and is not a socket\n'
+
+
+def test_serve_already_running(daemon, capsys):
+    assert _daemon.serve(daemon, jobs=1, idle_timeout=.01) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{daemon}: already in use\n'
+
+
+def test_main_daemon(tmpdir):
+    path = tmpdir.join('sock').strpath
+    assert main(('--daemon', path, '--daemon-idle-timeout', '.01')) == 0
+
+
+def test_main_daemon_filenames(capsys):
+    with pytest.raises(SystemExit):
+        main(('--daemon', 'sock', 'f.py'))
+    _, err = capsys.readouterr()
+    assert '--daemon does not take filenames' in err
+
+
+def test_client(daemon, tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    g = tmpdir.join('g.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = 5\n')
+    with mock.patch.object(_main, '_fix', side_effect=AssertionError):
+        assert _client.main((f.strpath, g.strpath, '--connect', daemon)) == 1
+    assert f.read() == 'x(\n    1,\n)\n'
+    _, err = capsys.readouterr()
+    assert err == f'Rewriting {f}\n'
+
+
+def test_client_not_running(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    assert _client.main((f.strpath, '--connect', tmpdir.join('s').strpath))
+    assert f.read() == 'x(\n    1,\n)\n'
+
+
+@pytest.mark.parametrize(
+    ('patch', 'expected'),
+    (
+        # the handler failed after reading the request
+        (
+            mock.patch.object(
+                _daemon._Handler, 'handle',
+                lambda self: self.rfile.readline(),
+            ),
+            "invalid response: b''",
+        ),
+        (
+            mock.patch.object(_daemon, '_response', return_value=[]),
+            "invalid response: b'[]\\n'",
+        ),
+        (
+            mock.patch.object(
+                _daemon, '_response', return_value={'error': 'x'},
+            ),
+            'x',
+        ),
+    ),
+)
+def test_client_daemon_error(daemon, tmpdir, capsys, patch, expected):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    with patch, mock.patch.object(_main, '_fix', side_effect=AssertionError):
+        assert _client.main((f.strpath, '--connect', daemon)) == 1
+    assert f.read() == 'x(\n    1\n)\n'
+    _, err = capsys.readouterr()
+    assert err == f'{f}: daemon error: {expected}\n'
+
+
+def test_client_exit_zero_even_if_changed(daemon, tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    args = (f.strpath, '--connect', daemon, '--exit-zero-even-if-changed')
+    assert _client.main(args) == 0
+    assert f.read() == 'x(\n    1,\n)\n'
+
+
+def test_client_stdin(daemon, capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'x(\n    1\n)\n'), 'UTF-8')
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert _client.main(('-', '--connect', daemon)) == 1
+    out, _ = capsys.readouterr()
+    assert out == 'x(\n    1,\n)\n'
+
+
+def test_client_non_utf8_bytes(daemon, tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write_binary('x = €\n'.encode('cp1252'))
+    assert _client.main((f.strpath, '--connect', daemon)) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{f} is non-utf-8 (not supported)\n'
+
+
+def test_client_imports_are_light():
+    code = (
+        'import sys\n'
+        'import add_trailing_comma._client\n'
+        'mods = [k for k in sys.modules if k.startswith("add_trailing")]\n'
+        'print(sorted(mods))\n'
+        'print("tokenize_rt" in sys.modules)\n'
+    )
+    out = subprocess.check_output((sys.executable, '-c', code), text=True)
+    assert out == (
+        "['add_trailing_comma', 'add_trailing_comma._client', "
+        "'add_trailing_comma._prefilter']\n"
+        'False\n'
+    )
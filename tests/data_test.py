@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import ast
+import collections
+import pkgutil
+import subprocess
+import sys
+from typing import Any
+
+from tokenize_rt import Offset
+
+from add_trailing_comma import _data
+from add_trailing_comma import _plugins
+
+
+def test_plugins_up_to_date():
+    mod_infos = pkgutil.iter_modules(_plugins.__path__)
+    assert _data.PLUGINS == tuple(sorted(name for _, name, _ in mod_infos))
+
+
+def test_import_does_not_search_for_plugins():
+    code = (
+        'import sys\n'
+        'import add_trailing_comma._main\n'
+        'print("pkgutil" in sys.modules)\n'
+        'print("importlib.metadata" in sys.modules)\n'
+    )
+    out = subprocess.check_output((sys.executable, '-c', code), text=True)
+    assert out == 'False\nFalse\n'
+
+
+def test_child_fields():
+    # `ctx` is left out, fields are reversed to be pushed onto the stack
+    assert _data._child_fields(ast.Name) == ()
+    assert _data._child_fields(ast.Call) == (
+        ('keywords', _data._LIST),
+        ('args', _data._LIST),
+        ('func', _data._NODE),
+    )
+    assert _data._child_fields(ast.BinOp) == (
+        ('right', _data._NODE), ('left', _data._NODE),
+    )
+
+
+class _Node(ast.AST):
+    """not generated from the grammar"""
+    _fields = ('a', 'b', 'c')
+    a: ast.AST
+    b: ast.AST
+    c: int
+
+
+class _Typed(ast.AST):
+    """_Typed(unknown a)"""
+    _fields = ('a',)
+    a: list[object]
+
+
+def _funcs() -> _data.ASTCallbackMapping:
+    return collections.defaultdict(list)  # type: ignore[return-value]
+
+
+def test_child_fields_without_signature():
+    assert _data._child_fields(_Node) == (
+        ('c', _data._ANY), ('b', _data._ANY), ('a', _data._ANY),
+    )
+    assert _data._child_fields(_Typed) == (('a', _data._ANY),)
+
+    tree, typed = _Node(), _Typed()
+    tree.a, tree.b, tree.c = typed, ast.Name('y'), 1
+    typed.a = [ast.Name('x'), 1]
+    seen = []
+
+    def visit_name(state: _data.State, node: ast.Name) -> list[Any]:
+        seen.append(node.id)
+        return []
+
+    funcs = _funcs()
+    funcs[ast.Name].append(visit_name)
+    assert len(_data.visit(funcs, tree)) == 0
+    assert seen == ['x', 'y']
+
+
+def _record(seen: list[tuple[str, bool]]) -> _data.ASTFunc[Any]:
+    def func(state: _data.State, node: Any) -> list[Any]:
+        seen.append((type(node).__name__, state.in_fstring))
+        return [(Offset(node.lineno, node.col_offset), lambda i, tokens: None)]
+    return func
+
+
+def test_visit_state_in_fstring():
+    seen: list[tuple[str, bool]] = []
+    funcs = _funcs()
+    funcs[ast.Call].append(_record(seen))
+    funcs[ast.Dict].append(_record(seen))
+    tree = ast.parse('f(f"{g(1)!r:{h(2)}}", {None: 1, **x})\n')
+    callbacks = _data.visit(funcs, tree)
+    assert seen == [
+        ('Call', False), ('Call', True), ('Call', True), ('Dict', False),
+    ]
+    assert len(callbacks) == 4
+
+
+def test_visit_does_not_add_to_funcs():
+    funcs = _funcs()
+    funcs[ast.Call].append(_record([]))
+    _data.visit(funcs, ast.parse('x = [1]\n'))
+    assert list(funcs.items()) == [(ast.Call, funcs[ast.Call])]
+
+
+def test_visit_skips_single_line_nodes():
+    seen: list[tuple[str, bool]] = []
+    funcs = _funcs()
+    for tp in (ast.Call, ast.List, ast.Tuple):
+        funcs[tp].append(_record(seen))
+    tree = ast.parse(
+        'f(a)\n'
+        '@d(\n'
+        '    b\n'
+        ')\n'
+        'def g(): h(c)\n'
+        'x[\n'
+        '    1, 2\n'
+        ']\n'
+        'y = [f(2)]\n',
+    )
+    _data.visit(funcs, tree, fixable_lines={9})
+    # the decorated `def` and the tuple in the brackets are still walked
+    assert [name for name, _ in seen] == ['Call', 'Tuple', 'List', 'Call']
+
+
+def test_visit_does_not_walk_data_literals():
+    seen: list[tuple[str, bool]] = []
+
+    def func(state: _data.State, node: Any) -> list[Any]:
+        seen.append((type(node).__name__, state.data_literal))
+        return []
+
+    funcs = _funcs()
+    for tp in (ast.Constant, ast.List, ast.Tuple):
+        funcs[tp].append(func)
+    tree = ast.parse('x = [1, (2, [-3])]\ny = [-z, ()]\nw = (4,), 5\n')
+    _data.visit(funcs, tree)
+    assert seen == [
+        # the elements of the literal are left to its callback
+        ('List', True),
+        ('List', False), ('Tuple', False),
+        # an unparenthesized tuple is fixed by the bracket before it
+        ('Tuple', False), ('Tuple', True), ('Constant', False),
+    ]
+
+
+def test_callbacks():
+    def func(i: int, tokens: Any, *params: int) -> None: ...
+
+    callbacks = _data.Callbacks()
+    callbacks.append(Offset(1, 2), func, (3, 4, 5, 6))
+    callbacks.append(Offset(7, 0), func)
+    assert len(callbacks) == 2
+    assert callbacks[0] == (Offset(1, 2), func, (3, 4, 5, 6))
+    assert callbacks[1] == (Offset(7, 0), func, ())
+    # the function is stored once rather than for each callback
+    assert callbacks.funcs == [func]
+    params = (3, 4, 5, 6)
+    assert _data.param_offsets(params) == {Offset(3, 4), Offset(5, 6)}
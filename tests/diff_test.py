@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import difflib
+
+import pytest
+
+from add_trailing_comma._core import fix_tokens
+from add_trailing_comma._diff import unified_diff
+from add_trailing_comma._token_helpers import Edit
+
+
+def _diff(src):
+    tokens = fix_tokens(src)
+    assert tokens is not None
+    return unified_diff('f.py', src, tokens.edits(src))
+
+
+@pytest.mark.parametrize(
+    'src',
+    (
+        pytest.param('f(\n    a\n)\n', id='one line'),
+        pytest.param('f(a,\n  b)\n', id='unhugged'),
+        pytest.param('f(\n    a\n)\ng(\n    b\n)\n', id='shared context'),
+        pytest.param(
+            'f(\n    a\n)\n' + 'x = 1\n' * 10 + 'g(\n    b\n)\n',
+            id='separate hunks',
+        ),
+        pytest.param('x = [\n    1\n]\n' * 3, id='several edits'),
+        pytest.param('x = (1, 2,)\ny = 3\n', id='removed comma'),
+    ),
+)
+def test_unified_diff_matches_difflib(src):
+    tokens = fix_tokens(src)
+    assert tokens is not None
+    new = tokens.render(src)
+    expected = difflib.unified_diff(
+        src.splitlines(True), new.splitlines(True), 'a/f.py', 'b/f.py',
+    )
+    assert _diff(src) == ''.join(expected)
+
+
+def test_unified_diff_no_changes():
+    assert unified_diff('f.py', 'x = 5\n', ()) == ''
+    # edits which rewrite text to the same text are left out
+    assert unified_diff('f.py', 'x = 5\n', (Edit(0, 1, 'x', ()),)) == ''
+
+
+def test_unified_diff_edits_on_one_line():
+    edits = (Edit(0, 1, 'y', ()), Edit(4, 5, '6', ()))
+    assert unified_diff('f.py', 'x = 5\n', edits) == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -1 +1 @@\n'
+        '-x = 5\n'
+        '+y = 6\n'
+    )
+
+
+def test_unified_diff_no_newline_at_end_of_file():
+    # as `git diff`, so `git apply` restores the missing newline
+    assert _diff('x = [1, 2,]') == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -1 +1 @@\n'
+        '-x = [1, 2,]\n'
+        '\\ No newline at end of file\n'
+        '+x = [1, 2]\n'
+        '\\ No newline at end of file\n'
+    )
+
+
+def test_unified_diff_inserted_lines():
+    edits = (Edit(6, 6, 'y = 6\n', ()),)
+    assert unified_diff('f.py', 'x = 5\n', edits, context=0) == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -1,0 +2 @@\n'
+        '+y = 6\n'
+    )
+    assert unified_diff('f.py', 'x = 5\n', edits) == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -1 +1,2 @@\n'
+        ' x = 5\n'
+        '+y = 6\n'
+    )
+
+
+def test_unified_diff_edit_starting_at_end_of_line():
+    edits = (Edit(5, 7, '\nz', ()),)
+    assert unified_diff('f.py', 'x = 5\ny\n', edits, context=0) == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -2 +2 @@\n'
+        '-y\n'
+        '+z\n'
+    )
@@ -11,6 +11,8 @@ from add_trailing_comma._main import _fix_src
         'class C: pass',
         'class C(): pass',
         'class C(object): pass',
+        'class C:\n'
+        '    pass',
         'class C(\n'
         '    object,\n'
         '): pass',
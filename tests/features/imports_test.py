@@ -10,6 +10,8 @@ from add_trailing_comma._main import _fix_src
     (
         'from os import path, makedirs\n',
         'from os import (path, makedirs)\n',
+        'from os import \\\n'
+        '    path\n',
         'from os import (\n'
         '    path,\n'
         '    makedirs,\n'
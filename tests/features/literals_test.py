@@ -12,6 +12,8 @@ from add_trailing_comma._main import _fix_src
         '[1, 2, 3, 4]',
         '{1, 2, 3, 4}',
         '{1: 2, 3: 4}',
+        'x = [\n]',
+        'x = {\n}',
         # Regression test for #26
         'if True:\n'
         '    pass\n'
@@ -124,6 +126,47 @@ def test_fixes_literals(src, expected):
     assert _fix_src(src) == expected
 
 
+@pytest.mark.parametrize(
+    ('src', 'expected'),
+    (
+        pytest.param(
+            'x = [\n'
+            '    (1, ), [2, ], [3], (\n'
+            '        3,\n'
+            '    ), [  # empty\n'
+            '    ]\n'
+            ']',
+
+            'x = [\n'
+            '    (1,), [2], [3], (\n'
+            '        3,\n'
+            '    ), [  # empty\n'
+            '    ],\n'
+            ']',
+            id='nested literals',
+        ),
+        pytest.param(
+            'x = {\n'
+            '    "a": (\n'
+            '        -1), "b": {\n'
+            '    }\n'
+            '}',
+
+            'x = {\n'
+            '    "a": (\n'
+            '        -1\n'
+            '    ), "b": {\n'
+            '    },\n'
+            '}',
+            id='parenthesized constant and empty dict',
+        ),
+    ),
+)
+def test_fixes_data_literals(src, expected):
+    # the brackets inside of literals of constants are fixed in one pass
+    assert _fix_src(src) == expected
+
+
 @pytest.mark.parametrize(
     ('src', 'expected'),
     (
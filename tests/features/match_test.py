@@ -14,12 +14,26 @@ from add_trailing_comma._main import _fix_src
             '        pass\n',
             id='sequence without braces',
         ),
+        pytest.param(
+            'match x:\n'
+            '    case 1, \\\n'
+            '            2:\n'
+            '        pass\n',
+            id='multi-line sequence without braces',
+        ),
         pytest.param(
             'match x:\n'
             '    case a():\n'
             '        pass\n',
             id='class without args',
         ),
+        pytest.param(
+            'match x:\n'
+            '    case a(\n'
+            '    ):\n'
+            '        pass\n',
+            id='multi-line class without args',
+        ),
     ),
 )
 def test_noop(s):
@@ -290,6 +290,20 @@ def test_noop_unhugs(src):
             '    *, kw=1, kw2=2,\n'
             '): pass',
         ),
+        pytest.param(
+            'f(g([a,\n'
+            '    b,\n'
+            ']))',
+
+            'f(\n'
+            '    g([\n'
+            '        a,\n'
+            '            b,\n'
+            '    ]),\n'
+            ')',
+
+            id='nested unhug with closing brace at start of line',
+        ),
     ),
 )
 def test_fix_unhugs(src, expected):
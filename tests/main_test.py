@@ -1,9 +1,19 @@
 from __future__ import annotations
 
+import argparse
 import io
+import json
+import os
+import pstats
+import subprocess
 import sys
 from unittest import mock
 
+import pytest
+
+from add_trailing_comma import _main
+from add_trailing_comma._main import _fix_file_captured
+from add_trailing_comma._main import fix_file
 from add_trailing_comma._main import main
 
 
@@ -11,6 +21,21 @@ def test_main_trivial():
     assert main(()) == 0
 
 
+def test_main_imports_are_light():
+    code = (
+        'import sys\n'
+        'import add_trailing_comma._main\n'
+        'heavy = (\n'
+        '    "add_trailing_comma._cache", "add_trailing_comma._daemon",\n'
+        '    "add_trailing_comma._diff", "cProfile", "concurrent.futures",\n'
+        '    "multiprocessing", "socketserver", "subprocess",\n'
+        ')\n'
+        'print([k for k in heavy if k in sys.modules])\n'
+    )
+    out = subprocess.check_output((sys.executable, '-c', code), text=True)
+    assert out == '[]\n'
+
+
 def test_main_noop(tmpdir):
     f = tmpdir.join('f.py')
     f.write('x = 5\n')
@@ -71,6 +96,13 @@ def test_main_py36_plus_function_trailing_commas(tmpdir):
     assert f.read() == 'def f(\n    **kwargs,\n): pass\n'
 
 
+def test_main_skips_files_the_prefilter_clears(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = f(1, 2)\n')
+    with mock.patch.object(_main, '_fix', side_effect=AssertionError):
+        assert main((f.strpath,)) == 0
+
+
 def test_main_stdin_no_changes(capsys):
     stdin = io.TextIOWrapper(io.BytesIO(b'x = 5\n'), 'UTF-8')
     with mock.patch.object(sys, 'stdin', stdin):
@@ -93,3 +125,483 @@ def test_main_exit_zero_even_if_changed(tmpdir):
     assert not main((str(f), '--exit-zero-even-if-changed'))
     assert f.read() == 'x(\n    1,\n)'
     assert not main((str(f), '--exit-zero-even-if-changed'))
+
+
+def test_main_jobs_multiple_files(tmpdir, capsys):
+    files = [tmpdir.join(f'f{i}.py') for i in range(5)]
+    for i, f in enumerate(files):
+        f.write('x(\n    1\n)\n' if i % 2 else 'x = 5\n')
+    assert main((*(f.strpath for f in files), '--jobs', '3')) == 1
+    _, err = capsys.readouterr()
+    assert err == f'Rewriting {files[1]}\nRewriting {files[3]}\n'
+    assert files[1].read() == 'x(\n    1,\n)\n'
+    assert files[2].read() == 'x = 5\n'
+
+
+def test_main_jobs_no_changes(tmpdir):
+    files = [tmpdir.join(f'f{i}.py') for i in range(3)]
+    for f in files:
+        f.write('x = 5\n')
+    assert main((*(f.strpath for f in files), '-j2')) == 0
+
+
+def test_main_jobs_invalid(capsys):
+    with pytest.raises(SystemExit):
+        main(('--jobs', '0'))
+    _, err = capsys.readouterr()
+    assert "expected a positive int: '0'" in err
+
+
+def _fix_file_args(**kwargs):
+    # the options which `main` passes to `fix_file`
+    args = argparse.Namespace(
+        exit_zero_even_if_changed=False,
+        cache_dir=[],
+        changed_lines=None,
+        check=False,
+        diff=False,
+        format=None,
+    )
+    vars(args).update(kwargs)
+    return args
+
+
+def test_fix_file_captured(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    args = _fix_file_args()
+    ret, out, err, counts = _fix_file_captured(f.strpath, args)
+    assert (ret, out, err) == (1, '', f'Rewriting {f}\n')
+    assert counts['files_rewritten', ''] == 1
+
+
+def test_fix_file_without_counts(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    args = _fix_file_args()
+    assert fix_file(f.strpath, args) == 1
+
+
+@pytest.mark.parametrize(
+    ('contents', 'expected'),
+    (
+        ('max 100000\n', 4),
+        ('200000 100000\n', 2),
+        ('50000 100000\n', 1),
+        ('garbage\n', 4),
+    ),
+)
+def test_cpu_count_cgroup(tmpdir, contents, expected):
+    f = tmpdir.join('cpu.max')
+    f.write(contents)
+    with (
+            mock.patch.object(_main, 'CGROUP_CPU_MAX', f.strpath),
+            mock.patch.object(
+                os, 'sched_getaffinity', create=True,
+                return_value={0, 1, 2, 3},
+            ),
+    ):
+        assert _main._cpu_count() == expected
+
+
+def test_cpu_count_no_cgroup(tmpdir):
+    cgroup_cpu_max = tmpdir.join('cpu.max').strpath
+    with (
+            mock.patch.object(_main, 'CGROUP_CPU_MAX', cgroup_cpu_max),
+            mock.patch.object(
+                os, 'sched_getaffinity', create=True, return_value={0, 1},
+            ),
+    ):
+        assert _main._cpu_count() == 2
+
+
+def test_main_cache(tmpdir, capsys):
+    cache_dir = tmpdir.join('cache')
+    f = tmpdir.join('f.py')
+    g = tmpdir.join('g.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = (1,)\n')
+    args = (f.strpath, g.strpath, '-j1', '--cache-dir', cache_dir.strpath)
+
+    assert main(args) == 1
+    assert f.read() == 'x(\n    1,\n)\n'
+    entries = [p for p in cache_dir.visit() if p.dirpath() != cache_dir]
+    assert len([p for p in entries if p.isfile()]) == 2
+
+    f.write('x(\n    1\n)\n')
+    with mock.patch.object(_main, '_fix', side_effect=AssertionError):
+        assert main(args) == 1
+    assert f.read() == 'x(\n    1,\n)\n'
+    _, err = capsys.readouterr()
+    assert err == f'Rewriting {f}\nRewriting {f}\n'
+
+
+def test_main_check(tmpdir, capsys):
+    f, g = tmpdir.join('f.py'), tmpdir.join('g.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = 5\n')
+    assert main((f.strpath, g.strpath, '--check')) == 1
+    assert f.read() == 'x(\n    1\n)\n'
+    out, err = capsys.readouterr()
+    assert (out, err) == ('', f'Would rewrite {f}\n')
+
+
+def test_main_check_noop(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1,\n)\n')
+    assert main((f.strpath, '--check')) == 0
+    assert capsys.readouterr() == ('', '')
+
+
+def test_main_check_stdin(capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'x(\n    1\n)\n'), 'UTF-8')
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('-', '--check')) == 1
+    assert capsys.readouterr() == ('', 'Would rewrite -\n')
+
+
+def test_main_check_line_ranges(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\ny(\n    2\n)\n')
+    assert main((f.strpath, '--check', '--line-ranges', '4-6')) == 1
+    assert main((f.strpath, '--check', '--line-ranges', '7-7')) == 0
+
+
+def test_main_check_cache(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    args = (f.strpath, '--cache-dir', cache_dir.strpath)
+
+    # nothing was rendered to cache
+    assert main((*args, '--check')) == 1
+    assert not cache_dir.exists()
+
+    assert main(args) == 1
+    f.write('x(\n    1\n)\n')
+    with mock.patch.object(_main, '_fix', side_effect=AssertionError):
+        assert main((*args, '--check')) == 1
+    assert f.read() == 'x(\n    1\n)\n'
+
+
+@pytest.mark.parametrize('opt', ('-j1', '--profile'))
+def test_main_fail_fast(tmpdir, capsys, opt):
+    files = [tmpdir.join(f'f{i}.py') for i in range(3)]
+    for f in files:
+        f.write('x(\n    1\n)\n')
+    args = (*(f.strpath for f in files), opt, '--check', '--fail-fast')
+    assert main(args) == 1
+    _, err = capsys.readouterr()
+    assert err.startswith(f'Would rewrite {files[0]}\n')
+    assert 'Would rewrite' not in err[len(f'Would rewrite {files[0]}\n'):]
+
+
+def test_main_fail_fast_jobs(tmpdir, capsys):
+    files = [tmpdir.join(f'f{i}.py') for i in range(8)]
+    for i, f in enumerate(files):
+        f.write('x(\n    1\n)\n' if i == 1 else 'x = 5\n')
+    args = (*(f.strpath for f in files), '-j2', '--check', '--fail-fast')
+    assert main(args) == 1
+    _, err = capsys.readouterr()
+    assert err == f'Would rewrite {files[1]}\n'
+
+
+def test_main_fail_fast_requires_check(capsys):
+    with pytest.raises(SystemExit):
+        main(('--fail-fast',))
+    _, err = capsys.readouterr()
+    assert '--fail-fast requires --check' in err
+
+
+def test_fix_file_captured_stops(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    args = _fix_file_args(check=True)
+    stop = mock.Mock(**{'is_set.return_value': False})
+    with mock.patch.object(_main, '_stop', None):
+        _main._init_worker(stop)
+        assert _fix_file_captured(f.strpath, args)[0] == 1
+        stop.set.assert_called_once_with()
+
+        stop.is_set.return_value = True
+        assert _fix_file_captured(f.strpath, args) == (0, '', '', {})
+
+
+def test_main_cache_evicts(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    f = tmpdir.join('f.py')
+    f.write('x = (1,)\n')
+    args = (f.strpath, '--cache-dir', cache_dir.strpath)
+    assert main((*args, '--cache-max-size', '0')) == 0
+    subdirs = cache_dir.listdir(lambda p: p.isdir())
+    assert subdirs
+    assert not any(subdir.listdir() for subdir in subdirs)
+
+
+@pytest.mark.parametrize(
+    ('s', 'expected'),
+    (('123', 123), ('2k', 2048), ('1M', 1 << 20), ('3G', 3 << 30)),
+)
+def test_size(s, expected):
+    assert _main._size(s) == expected
+
+
+def test_size_invalid(capsys):
+    with pytest.raises(SystemExit):
+        main(('--cache-max-size', 'big'))
+    _, err = capsys.readouterr()
+    assert "expected a size: 'big'" in err
+
+
+def test_main_line_ranges(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n\n@d(\n    2\n)\ndef f(): pass\n\ny(\n    3\n)\n')
+    assert main((f.strpath, '--line-ranges', '6-6', '--line-ranges', '2-2'))
+    assert f.read() == (
+        'x(\n    1,\n)\n\n@d(\n    2,\n)\ndef f(): pass\n\ny(\n    3\n)\n'
+    )
+
+
+def test_main_line_ranges_outside_brackets(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('if x:\n    f(\n        1\n    )\ng(\n    2\n)\nh = 1\n')
+    assert main((f.strpath, '--line-ranges', '8-9')) == 0
+
+
+def test_main_line_ranges_unhugs_only_overlapping_brackets(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('f(a,\n  g(b,\n    c))\n')
+    assert main((f.strpath, '--line-ranges', '1-1')) == 1
+    assert f.read() == 'f(\n    a,\n    g(b,\n      c),\n)\n'
+
+
+def test_main_line_ranges_requires_one_file(capsys):
+    with pytest.raises(SystemExit):
+        main(('a.py', 'b.py', '--line-ranges', '1-2'))
+    _, err = capsys.readouterr()
+    assert '--line-ranges requires exactly one filename' in err
+
+
+def test_main_line_ranges_and_from_ref(capsys):
+    with pytest.raises(SystemExit):
+        main(('a.py', '--line-ranges', '1-2', '--from-ref', 'HEAD'))
+    _, err = capsys.readouterr()
+    assert 'not allowed with argument' in err
+
+
+def test_main_from_ref_stdin(capsys):
+    with pytest.raises(SystemExit):
+        main(('-', '--from-ref', 'HEAD'))
+    _, err = capsys.readouterr()
+    assert '--from-ref cannot read from stdin' in err
+
+
+def test_main_to_ref_requires_from_ref(capsys):
+    with pytest.raises(SystemExit):
+        main(('a.py', '--to-ref', 'HEAD'))
+    _, err = capsys.readouterr()
+    assert '--to-ref requires --from-ref' in err
+
+
+def _git(*args, cwd):
+    subprocess.check_call(('git', '-C', str(cwd), *args))
+
+
+def test_main_diff(tmpdir, capsys):
+    f, g, h = tmpdir.join('f.py'), tmpdir.join('g.py'), tmpdir.join('h.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = 5\n')
+    h.write('x = (\n')
+    args = ('f.py', 'g.py', 'h.py', '--diff', '--cache-dir', 'cache')
+    with tmpdir.as_cwd():
+        assert main(args) == 1
+    assert f.read() == 'x(\n    1\n)\n'
+    out, err = capsys.readouterr()
+    assert out == (
+        '--- a/f.py\n'
+        '+++ b/f.py\n'
+        '@@ -1,3 +1,3 @@\n'
+        ' x(\n'
+        '-    1\n'
+        '+    1,\n'
+        ' )\n'
+    )
+    assert err == ''
+
+
+def test_main_format_edits_json(tmpdir, capsys):
+    f, g = tmpdir.join('f.py'), tmpdir.join('g.py')
+    f.write('x(\n    1\n)\ny = (1, 2,)\n')
+    g.write('x = 5\n')
+    assert main((f.strpath, g.strpath, '--format=edits-json')) == 1
+    assert f.read() == 'x(\n    1\n)\ny = (1, 2,)\n'
+
+    out, err = capsys.readouterr()
+    assert err == ''
+    first, second = (json.loads(line) for line in out.splitlines())
+    assert first['filename'] == f.strpath
+    assert [edit['plugins'] for edit in first['edits']] == [
+        ['calls'], ['literals'],
+    ]
+    assert second == {'filename': g.strpath, 'edits': []}
+
+    # applied from the end the offsets of the other edits do not move
+    src = f.read()
+    for edit in reversed(first['edits']):
+        assert src[edit['start']:edit['end']] == edit['old']
+        src = f'{src[:edit["start"]]}{edit["new"]}{src[edit["end"]:]}'
+    assert main((f.strpath,)) == 1
+    assert f.read() == src
+
+
+def test_main_diff_line_ranges(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\ny(\n    2\n)\n')
+    assert main((f.strpath, '--diff', '--line-ranges', '7-7')) == 0
+    assert capsys.readouterr() == ('', '')
+
+
+def test_main_diff_git_apply(tmpdir, capsys):
+    _git('init', '-q', cwd=tmpdir)
+    files = [tmpdir.join(f'f{i}.py') for i in range(4)]
+    for i, f in enumerate(files):
+        f.write('x(\n    1\n)\n' if i % 2 else 'x = [1, 2,]')
+    names = [f.basename for f in files]
+
+    with tmpdir.as_cwd():
+        assert main((*names, '--diff', '-j2')) == 1
+    patch, _ = capsys.readouterr()
+    tmpdir.join('fix.patch').write(patch)
+    _git('apply', 'fix.patch', cwd=tmpdir)
+    applied = [f.read() for f in files]
+
+    with tmpdir.as_cwd():
+        assert main((*names, '-j2', '--exit-zero-even-if-changed')) == 0
+    assert [f.read() for f in files] == applied
+
+
+def test_main_from_ref(tmpdir):
+    _git('init', '-q', cwd=tmpdir)
+    _git('config', 'user.name', 'test', cwd=tmpdir)
+    _git('config', 'user.email', 'test@example.com', cwd=tmpdir)
+    f = tmpdir.join('f.py')
+    g = tmpdir.join('g.py')
+    f.write('x(\n    1\n)\n')
+    g.write('y = [\n    2\n]\n')
+    _git('add', '.', cwd=tmpdir)
+    _git('commit', '-qm', 'initial', cwd=tmpdir)
+    f.write('x(\n    1\n)\nz(\n    3\n)\n')
+
+    h = tmpdir.join('h.py')
+    h.write('w = [\n    4\n]\n')
+
+    with tmpdir.as_cwd():
+        assert main(('f.py', 'g.py', 'h.py', '--from-ref', 'HEAD')) == 1
+    assert f.read() == 'x(\n    1\n)\nz(\n    3,\n)\n'
+    assert g.read() == 'y = [\n    2\n]\n'
+    # not tracked, every line is new
+    assert h.read() == 'w = [\n    4,\n]\n'
+
+
+def test_main_from_ref_invalid(tmpdir):
+    _git('init', '-q', cwd=tmpdir)
+    with tmpdir.as_cwd():
+        assert main(('f.py', '--from-ref', 'does-not-exist')) == 1
+
+
+def test_main_profile(tmpdir, capsys):
+    f, g = tmpdir.join('f.py'), tmpdir.join('g.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = 5\n')
+    profile_json = tmpdir.join('profile.json')
+    args = (
+        f.strpath, g.strpath,
+        '--profile', '--profile-top', '1',
+        '--profile-json', profile_json.strpath,
+    )
+    assert main(args) == 1
+    assert f.read() == 'x(\n    1,\n)\n'
+
+    _, err = capsys.readouterr()
+    assert err.startswith(f'Rewriting {f}\n2 files in ')
+    assert '\nfix ' in err
+    assert '\n  calls ' in err
+    assert '\nexpensive brackets' in err
+    assert f'\n{f}:1:2 ' in err
+
+    contents = json.loads(profile_json.read())
+    assert set(contents['files']) == {f.strpath, g.strpath}
+    # the prefilter skips `g.py` before it is parsed
+    assert 'parse' in contents['files'][f.strpath]
+    assert 'parse' not in contents['files'][g.strpath]
+    assert len(contents['slowest']) == 1
+    assert contents['slowest'][0]['brackets'][0]['line'] == 1
+
+
+def test_main_profile_syntax_error(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = (\n')
+    profile_json = tmpdir.join('profile.json')
+    args = (f.strpath, '--profile', '--profile-json', profile_json.strpath)
+    assert main(args) == 0
+
+    _, err = capsys.readouterr()
+    assert 'expensive brackets' not in err
+    contents = json.loads(profile_json.read())
+    assert contents['slowest'][0]['brackets'] == []
+
+
+def test_main_profile_output(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x(\n    1\n)\n')
+    profile_output = tmpdir.join('out.prof')
+    stdin = io.TextIOWrapper(io.BytesIO(b'y = 5\n'), 'UTF-8')
+    args = (
+        f.strpath, '-',
+        '--profile', '--profile-output', profile_output.strpath,
+    )
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(args) == 1
+
+    # stdin cannot be read again so it is left out of the profile
+    stats = pstats.Stats(profile_output.strpath).get_stats_profile()
+    assert 'fix_tokens' in stats.func_profiles
+
+
+def test_main_profile_options_require_profile(capsys):
+    with pytest.raises(SystemExit):
+        main(('--profile-json', 'out.json'))
+    _, err = capsys.readouterr()
+    assert '--profile-json / --profile-output require --profile' in err
+
+
+def _metrics(path):
+    ret = {}
+    for line in path.read().splitlines():
+        if not line.startswith('#'):
+            name, value = line.split(' ')
+            ret[name] = int(value)
+    return ret
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_metrics_file(tmpdir, jobs):
+    f, g, h = tmpdir.join('f.py'), tmpdir.join('g.py'), tmpdir.join('h.py')
+    f.write('x(\n    1\n)\n')
+    g.write('x = (1,)\n')
+    h.write('x = (\n')
+    metrics_file = tmpdir.join('metrics.txt')
+    args = (f, g, h, '--jobs', jobs, '--metrics-file', metrics_file)
+    assert main(tuple(str(arg) for arg in args)) == 1
+
+    assert metrics_file.read().endswith('\n# EOF\n')
+    metrics = _metrics(metrics_file)
+    assert metrics['add_trailing_comma_files_total'] == 3
+    assert metrics['add_trailing_comma_files_parsed_total'] == 2
+    assert metrics['add_trailing_comma_files_syntax_error_total'] == 1
+    assert metrics['add_trailing_comma_files_rewritten_total'] == 1
+    calls = 'add_trailing_comma_{}_total{{plugin="calls"}}'.format
+    assert metrics[calls('callbacks')] == 1
+    assert metrics[calls('fixes')] == 1
+    assert metrics[calls('commas_added')] == 1
+    assert metrics[calls('tokens_inserted')] == 1
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import collections
+
+from add_trailing_comma import _metrics
+from add_trailing_comma._data import PLUGINS
+
+
+def test_plugin_names():
+    assert len(_metrics.PLUGIN_NAMES) == len(PLUGINS) + 1
+    assert 'with' in _metrics.PLUGIN_NAMES
+    assert _metrics.PLUGIN_NAMES[-1] == 'braces'
+
+
+def test_openmetrics():
+    counts: _metrics.Counts = collections.Counter()
+    counts['files', ''] = 2
+    counts['commas_added', 'calls'] = 3
+    counts['tokens_scanned', 'find_call'] = 4
+    lines = _metrics.openmetrics(counts).splitlines()
+
+    assert lines[:3] == [
+        '# TYPE add_trailing_comma_files counter',
+        '# HELP add_trailing_comma_files files checked',
+        'add_trailing_comma_files_total 2',
+    ]
+    assert 'add_trailing_comma_files_parsed_total 0' in lines
+    # every plugin is listed so the series do not come and go
+    assert 'add_trailing_comma_commas_added_total{plugin="calls"} 3' in lines
+    assert 'add_trailing_comma_commas_added_total{plugin="with"} 0' in lines
+    scanned = 'add_trailing_comma_tokens_scanned_total{helper="find_call"}'
+    assert f'{scanned} 4' in lines
+    assert lines[-1] == '# EOF'
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os.path
+import re
+
+import pytest
+
+from add_trailing_comma._main import _fix_src
+from add_trailing_comma._prefilter import unchanged
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+@pytest.mark.parametrize(
+    'src',
+    (
+        b'',
+        b'x = 5\n',
+        b'f(a, b)\n',
+        b'x = [1, 2, 3]\n',
+        b'x = """\n(\n"""\n',
+        b"x = '('  # (\n",
+        b"x = f'{x!r:>{width}}'\n",
+        b"x = f'{x[\"y\"]}'\n",
+        b"x = rb'\\''\n",
+        b"x = f'{{x}}'\n",
+        b'x = 5  # no newline',
+        b'if True:\n    f(x)\n',
+        b'x = 1 + \\\n    2\n',
+    ),
+)
+def test_unchanged(src):
+    assert unchanged(src)
+    assert _fix_src(src.decode()) == src.decode()
+
+
+@pytest.mark.parametrize(
+    'src',
+    (
+        # multi-line brackets
+        b'f(\n    a\n)\n',
+        b'f(\n    a,\n)\n',
+        b'f(a,  # comment\n  b)\n',
+        b'f(a, \\\n  b)\n',
+        b'x = (\n    """\n    """\n)\n',
+        # whitespace or a comma before a closing bracket
+        b'f(a, )\n',
+        b'f(a,)\n',
+        b'x = [ ]\n',
+        b"x = ', )'\n",
+        # single element tuples keep their comma but are not told apart
+        b'x = (1,)\n',
+        # unbalanced or unterminated
+        b'f(\n',
+        b')\n',
+        b"x = 'y\n",
+        # replacement fields which may be tokenized
+        b"x = f'{f\"{x}\"\n}'\n",
+        b'x = f"{x["y"]}"\n',
+        b"x = f'{x:{'\n",
+        b"x = f'{x['''y''']}'\n",
+        b'x = f"{x[\'\'\'y\'\'\']}"\n',
+        b"x = f'{x  # comment}'\n",
+        b"x = f'{x}}'\n",
+        b"x = f'{x[\"\\\\\"]}'\n",
+        b"x = f'{x[\"y]}'\n",
+    ),
+)
+def test_may_change(src):
+    assert not unchanged(src)
+
+
+def _variants(src):
+    yield src
+    # remove trailing commas
+    yield re.sub(r',(\s*\n\s*[)\]}])', r'\1', src)
+    # hug opening and closing brackets
+    yield re.sub(r'([(\[{])\n\s+', r'\1', src)
+    yield re.sub(r'\n\s*([)\]}])', r'\1', src)
+    # add trailing commas to single line brackets
+    yield re.sub(r'(\w)([)\]}])', r'\1, \2', src)
+
+
+def _sources():
+    # not the whole checkout: it may hold a virtualenv, `.tox`, ...
+    for top in ('add_trailing_comma', 'tests', 'testing'):
+        for dirpath, _, filenames in os.walk(os.path.join(ROOT, top)):
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    filename = os.path.join(dirpath, filename)
+                    with open(filename, encoding='UTF-8') as f:
+                        yield from _variants(f.read())
+
+
+def test_unchanged_agrees_with_fix_src():
+    for src in _sources():
+        if unchanged(src.encode()):
+            assert _fix_src(src) == src
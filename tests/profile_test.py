@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+
+from add_trailing_comma import _profile
+
+FILES = {
+    'a.py': {
+        'parse': .1, 'visit': .05, 'tokenize': .2, 'fix': .1,
+        'fix.calls': .02, 'fix.braces': .04, 'render': .05, 'total': .6,
+    },
+    'b.py': {'total': .1},
+}
+BRACKETS = {'a.py': [(3, 4, 120), (1, 0, 7)]}
+
+
+def test_timed():
+    timings: _profile.Timings = {}
+    for _ in range(2):
+        with _profile.timed(timings, 'parse'):
+            pass
+    assert set(timings) == {'parse'}
+
+    with pytest.raises(ValueError), _profile.timed(timings, 'fix'):
+        raise ValueError
+    assert set(timings) == {'parse', 'fix'}
+
+
+def test_timed_disabled():
+    with _profile.timed(None, 'parse'):
+        pass
+
+
+def test_report():
+    assert _profile.report(FILES, 1) == (
+        '2 files in 0.700s\n'
+        '\n'
+        'phase                      seconds      %\n'
+        'parse                        0.100   14.3\n'
+        'tokenize                     0.200   28.6\n'
+        'visit                        0.050    7.1\n'
+        'fix                          0.100   14.3\n'
+        '  braces                     0.040    5.7\n'
+        '  calls                      0.020    2.9\n'
+        'render                       0.050    7.1\n'
+        'other                        0.200   28.6\n'
+        '\n'
+        'slowest files              seconds\n'
+        'a.py                         0.600\n'
+    )
+
+
+def test_report_brackets():
+    assert _profile.report(FILES, 1, BRACKETS).endswith(
+        'slowest files              seconds\n'
+        'a.py                         0.600\n'
+        '\n'
+        'expensive brackets          tokens\n'
+        'a.py:3:5                       120\n'
+        'a.py:1:1                         7\n',
+    )
+
+
+def test_report_no_files():
+    assert _profile.report({}, 10).startswith('0 files in 0.000s\n')
+
+
+def test_to_json():
+    ret = _profile.to_json(FILES, 1)
+    assert ret['total'] == pytest.approx(.7)
+    assert list(ret['phases']) == [
+        'parse', 'tokenize', 'visit', 'fix', 'fix.braces', 'fix.calls',
+        'render', 'other',
+    ]
+    assert ret['slowest'] == [
+        {'filename': 'a.py', **FILES['a.py'], 'brackets': []},
+    ]
+    assert ret['files'] == FILES
+
+
+def test_to_json_brackets():
+    ret = _profile.to_json(FILES, 1, BRACKETS)
+    assert ret['slowest'][0]['brackets'] == [
+        {'line': 3, 'utf8_byte_offset': 4, 'tokens': 120},
+        {'line': 1, 'utf8_byte_offset': 0, 'tokens': 7},
+    ]
+
+
+def test_write_profile_speedscope(tmpdir):
+    path = tmpdir.join('profile.json')
+    funcs = [('a.py', lambda: time.sleep(.05)), ('b.py', lambda: None)]
+    _profile.write_profile(path.strpath, funcs)
+
+    contents = json.loads(path.read())
+    frames = contents['shared']['frames']
+    first, second = contents['profiles']
+    assert first['name'] == 'a.py'
+    assert first['samples']
+    assert len(first['samples']) == len(first['weights'])
+    assert any(frames[i]['name'] == '<lambda>' for i in first['samples'][0])
+    assert second['name'] == 'b.py'
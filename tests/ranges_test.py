@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import subprocess
+
+import pytest
+
+from add_trailing_comma._ranges import git_changed_lines
+from add_trailing_comma._ranges import IntervalIndex
+from add_trailing_comma._ranges import line_range
+from add_trailing_comma._ranges import LineRanges
+from add_trailing_comma._ranges import parse_diff
+
+
+def test_line_ranges_merged():
+    ranges = LineRanges([(8, 9), (1, 2), (3, 4), (2, 2), (20, 30)])
+    assert list(ranges) == [(1, 4), (8, 9), (20, 30)]
+
+
+@pytest.mark.parametrize(
+    ('start', 'end', 'expected'),
+    (
+        (1, 1, False),
+        (1, 2, True),
+        (3, 4, True),
+        (6, 7, False),
+        (6, 8, True),
+        (1, 100, True),
+        (11, 100, False),
+    ),
+)
+def test_line_ranges_intersects(start, end, expected):
+    ranges = LineRanges([(2, 5), (8, 10)])
+    assert ranges.intersects(start, end) is expected
+
+
+def test_line_ranges_empty():
+    ranges = LineRanges(())
+    assert not ranges
+    assert not ranges.intersects(1, 100)
+
+
+def test_interval_index():
+    intervals = [(1, 10, 0), (2, 3, 1), (4, 4, 2), (5, 20, 3), (12, 13, 4)]
+    index = IntervalIndex(intervals)
+    for start in range(22):
+        for end in range(start, 22):
+            expected = {
+                value
+                for interval_start, interval_end, value in intervals
+                if interval_start <= end and interval_end >= start
+            }
+            assert set(index.overlapping(start, end)) == expected
+
+
+def test_interval_index_empty():
+    assert IntervalIndex(()).overlapping(1, 10) == []
+
+
+def test_line_range():
+    assert line_range('3-5') == (3, 5)
+
+
+@pytest.mark.parametrize('s', ('3', '5-3', '0-1', 'a-b', '-'))
+def test_line_range_invalid(s):
+    with pytest.raises(argparse.ArgumentTypeError) as excinfo:
+        line_range(s)
+    msg, = excinfo.value.args
+    assert msg == f'expected a line range START-END: {s!r}'
+
+
+def test_parse_diff():
+    diff = (
+        b'diff --git a/f.py b/f.py\n'
+        b'--- a/f.py\n'
+        b'+++ b/f.py\n'
+        b'@@ -1 +1 @@\n'
+        b'-x\n'
+        b'+y\n'
+        b'@@ -5,2 +5,3 @@ def f():\n'
+        b'@@ -10,2 +11,0 @@\n'
+        b'diff --git a/g.py b/g.py\n'
+        b'--- a/g.py\n'
+        b'+++ /dev/null\n'
+        b'@@ -1,3 +0,0 @@\n'
+        b'diff --git a/d/h.py b/d/h.py\n'
+        b'--- /dev/null\n'
+        b'+++ b/d/h.py\n'
+        b'@@ -0,0 +1,2 @@\n'
+    )
+    ret = parse_diff(diff)
+    assert {k: list(v) for k, v in ret.items()} == {
+        'f.py': [(1, 1), (5, 7), (11, 12)],
+        'd/h.py': [(1, 2)],
+    }
+
+
+def test_parse_diff_paths():
+    diff = (
+        b'+++ b/a b.py\t\n'
+        b'@@ -1 +1 @@\n'
+        b'+++ "b/c\\"d\\\\e\\tf.py"\n'
+        b'@@ -2 +2 @@\n'
+        b'+++ "b/g h\\303\\251.py"\t\n'
+        b'@@ -3 +3 @@\n'
+    )
+    ret = parse_diff(diff)
+    assert {k: list(v) for k, v in ret.items()} == {
+        'a b.py': [(1, 1)],
+        'c"d\\e\tf.py': [(2, 2)],
+        'g h\N{LATIN SMALL LETTER E WITH ACUTE}.py': [(3, 3)],
+    }
+
+
+def _git(*args, cwd):
+    subprocess.check_call(('git', '-C', str(cwd), *args))
+
+
+@pytest.fixture
+def repo(tmpdir):
+    _git('init', '-q', cwd=tmpdir)
+    _git('config', 'user.name', 'test', cwd=tmpdir)
+    _git('config', 'user.email', 'test@example.com', cwd=tmpdir)
+    tmpdir.join('f.py').write('a\nb\nc\nd\n')
+    tmpdir.join('g.py').write('x\n')
+    _git('add', '.', cwd=tmpdir)
+    _git('commit', '-qm', 'initial', cwd=tmpdir)
+    with tmpdir.as_cwd():
+        yield tmpdir
+
+
+def _lists(ret):
+    return {k: None if v is None else list(v) for k, v in ret.items()}
+
+
+def test_git_changed_lines(repo):
+    repo.join('f.py').write('a\nB\nc\nd\ne\n')
+    ret = git_changed_lines('HEAD', None, ['f.py', './g.py'])
+    assert _lists(ret) == {
+        'f.py': [(2, 2), (5, 5)],
+        './g.py': [],
+    }
+
+
+def test_git_changed_lines_quoted_paths(repo):
+    names = ('a b.py', 'c"d.py')
+    for name in names:
+        repo.join(name).write('a\nb\n')
+    _git('add', '.', cwd=repo)
+    _git('commit', '-qm', 'quoted', cwd=repo)
+    for name in names:
+        repo.join(name).write('a\nB\n')
+    ret = git_changed_lines('HEAD', None, names)
+    assert _lists(ret) == {name: [(2, 2)] for name in names}
+
+
+def test_git_changed_lines_to_ref(repo):
+    repo.join('f.py').write('a\nB\nc\nd\n')
+    _git('commit', '-qam', 'second', cwd=repo)
+    repo.join('f.py').write('a\nb\nc\nD\n')
+    ret = git_changed_lines('HEAD~1', 'HEAD', ['f.py'])
+    assert _lists(ret) == {'f.py': [(2, 2)]}
+
+
+def test_git_changed_lines_outside_cwd(repo):
+    repo.join('f.py').write('a\nB\nc\nd\n')
+    repo.join('d').ensure_dir()
+    with repo.join('d').as_cwd():
+        ret = git_changed_lines('HEAD', None, ['../f.py', '../g.py'])
+    assert _lists(ret) == {
+        '../f.py': [(2, 2)],
+        '../g.py': [],
+    }
+
+
+def test_git_changed_lines_untracked(repo):
+    repo.join('h.py').write('x\n')
+    assert git_changed_lines('HEAD', None, ['h.py']) == {'h.py': None}
+    # compared between commits the working tree does not matter
+    ret = git_changed_lines('HEAD', 'HEAD', ['h.py'])
+    assert _lists(ret) == {'h.py': []}
+
+
+def test_git_changed_lines_no_files(repo):
+    assert git_changed_lines('HEAD', None, []) == {}
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import math
+import os.path
+import sys
+from collections.abc import Callable
+from types import FrameType
+from typing import Any
+
+import pytest
+from tokenize_rt import src_to_tokens
+
+import add_trailing_comma
+from add_trailing_comma import _core
+from add_trailing_comma._plugins.literals import _find_tuple
+from add_trailing_comma._token_helpers import find_call
+from add_trailing_comma._token_helpers import find_simple
+from add_trailing_comma._token_helpers import fix_brace
+from add_trailing_comma._token_helpers import START_BRACES
+from add_trailing_comma._token_helpers import Tokens
+
+# the work done is measured as the number of lines of this package which are
+# executed rather than wall time, so these are stable on noisy machines.  a
+# linear algorithm has a log-log slope of ~1, `n log n` slightly more and
+# quadratic ones ~2
+MAX_SLOPE = 1.25
+
+PACKAGE_DIR = os.path.dirname(add_trailing_comma.__file__)
+
+SIZES = (100, 200, 400, 800)
+# the parser limits how deeply brackets may be nested
+DEPTHS = (25, 50, 100, 200)
+
+
+def _count_lines(func: Callable[[], object]) -> int:
+    count = 0
+
+    # the tracer replaces coverage's while counting, so these are not covered
+    def _local(  # pragma: no cover
+            frame: FrameType, event: str, arg: Any,
+    ) -> Any:
+        nonlocal count
+        if event == 'line':
+            count += 1
+        return _local
+
+    def _global(  # pragma: no cover
+            frame: FrameType, event: str, arg: Any,
+    ) -> Any:
+        if frame.f_code.co_filename.startswith(PACKAGE_DIR):
+            return _local
+        else:
+            return None
+
+    orig = sys.gettrace()
+    sys.settrace(_global)
+    try:
+        func()
+    finally:
+        sys.settrace(orig)
+    return count
+
+
+def _slope(sizes: tuple[int, ...], counts: list[int]) -> float:
+    # least squares fit of `log(count) = slope * log(size) + c`
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(c) for c in counts]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    num = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    den = sum((x - x_mean) ** 2 for x in xs)
+    return num / den
+
+
+def _assert_scales(
+        sizes: tuple[int, ...],
+        func: Callable[[int], Callable[[], object]],
+) -> None:
+    # once outside of the tracer for coverage and to fill any caches
+    func(sizes[0])()
+    counts = [_count_lines(func(n)) for n in sizes]
+    slope = _slope(sizes, counts)
+    assert slope < MAX_SLOPE, (sizes, counts)
+
+
+def _fix(src: str) -> Callable[[], object]:
+    def func() -> object:
+        tokens = _core.fix_tokens(src)
+        assert tokens is not None
+        return tokens.render(src)
+    return func
+
+
+def _args(n: int) -> str:
+    return ''.join(f'    a{i},\n' for i in range(n))
+
+
+def _call_args(n: int) -> str:
+    return f'f(\n{_args(n)[:-2]}\n)\n'
+
+
+def _call_line_length(n: int) -> str:
+    return f'f({", ".join(f"a{i}" for i in range(n))}, )\n'
+
+
+def _call_nested(n: int) -> str:
+    # every call hugs its first argument so each is unhugged and reindented
+    src = '1'
+    for _ in range(n):
+        src = f'f({src},\n    x)'
+    return f'{src}\n'
+
+
+def _call_chain(n: int) -> str:
+    links = ''.join(f'    .m{i}(\n        a)\n' for i in range(n))
+    return f'x = (\n    obj\n{links})\n'
+
+
+def _literal_dict(n: int) -> str:
+    items = ''.join(f'    k{i}: v{i},\n' for i in range(n))
+    return f'x = {{\n{items[:-2]}\n}}\n'
+
+
+def _literal_tuple_nested(n: int) -> str:
+    src = '1'
+    for _ in range(n):
+        src = f'(\n{src},\n2\n)'
+    return f'x = {src}\n'
+
+
+def _literal_list_nested_name(n: int) -> str:
+    # not a literal of constants, neither is any of the lists around `x`
+    src = 'x'
+    for _ in range(n):
+        src = f'[\n{src},\n2, 3\n]'
+    return f'y = {src}\n'
+
+
+def _literal_set_line_length(n: int) -> str:
+    return f'x = {{{", ".join(str(i) for i in range(n))}, }}\n'
+
+
+def _function_args(n: int) -> str:
+    return f'def f(\n{_args(n)[:-2]}\n):\n    pass\n'
+
+
+def _class_bases(n: int) -> str:
+    return f'class C(\n{_args(n)[:-2]}\n):\n    pass\n'
+
+
+def _imports(n: int) -> str:
+    return f'from m import (\n{_args(n)[:-2]}\n)\n'
+
+
+def _with_items(n: int) -> str:
+    items = ''.join(f'    open(f{i}) as f{i},\n' for i in range(n))
+    return f'with (\n{items[:-2]}\n):\n    pass\n'
+
+
+def _match_cases(n: int) -> str:
+    cases = ''.join(
+        f'    case C(\n        {i},\n        y\n    ):\n        pass\n'
+        f'    case [\n        {i},\n        y\n    ]:\n        pass\n'
+        f'    case {{\n        {i}: y\n    }}:\n        pass\n'
+        for i in range(n)
+    )
+    return f'match x:\n{cases}'
+
+
+def _pep695_params(n: int) -> str:  # pragma: >=3.12 cover
+    return f'def f[\n{_args(n)[:-2]}\n](x):\n    pass\n'
+
+
+@pytest.mark.parametrize(
+    ('sizes', 'gen'),
+    (
+        pytest.param(SIZES, _call_args, id='call args'),
+        pytest.param(SIZES, _call_line_length, id='call line length'),
+        pytest.param(DEPTHS, _call_nested, id='call nesting depth'),
+        pytest.param(SIZES, _call_chain, id='call chain length'),
+        pytest.param(SIZES, _literal_dict, id='dict items'),
+        pytest.param(DEPTHS, _literal_tuple_nested, id='tuple nesting depth'),
+        pytest.param(
+            DEPTHS, _literal_list_nested_name, id='list nesting depth',
+        ),
+        pytest.param(SIZES, _literal_set_line_length, id='set line length'),
+        pytest.param(SIZES, _function_args, id='function args'),
+        pytest.param(SIZES, _class_bases, id='class bases'),
+        pytest.param(SIZES, _imports, id='import names'),
+        pytest.param(SIZES, _with_items, id='with items'),
+        pytest.param(SIZES, _match_cases, id='match cases'),
+        pytest.param(
+            SIZES, _pep695_params, id='pep695 type params',
+            marks=pytest.mark.skipif(
+                sys.version_info < (3, 12), reason='py312+',
+            ),
+        ),
+    ),
+)
+def test_plugin_scaling(sizes, gen):
+    _assert_scales(sizes, lambda n: _fix(gen(n)))
+
+
+def _brace_indices(tokens: Tokens) -> list[int]:
+    return [
+        i for i, token in enumerate(tokens.original)
+        if token.name == 'OP' and token.src in START_BRACES
+    ]
+
+
+def _find_simple_all(n: int) -> Callable[[], object]:
+    tokens = Tokens(src_to_tokens(_literal_tuple_nested(n)))
+    return lambda: [find_simple(i, tokens) for i in _brace_indices(tokens)]
+
+
+def _find_call_all(n: int) -> Callable[[], object]:
+    # the arguments of each call come after the (growing) callee
+    src = _call_nested(n)
+    tokens = Tokens(src_to_tokens(src))
+    calls = [
+        (i - 1, {tokens.original[i + 1].offset})
+        for i in _brace_indices(tokens)
+    ]
+    return lambda: [find_call(args, i, tokens) for i, args in calls]
+
+
+def _fix_brace_all(n: int) -> Callable[[], object]:
+    tokens = Tokens(src_to_tokens(_call_nested(n)))
+
+    def func() -> None:
+        for i in reversed(_brace_indices(tokens)):
+            fix_data = find_simple(i, tokens)
+            fix_brace(tokens, fix_data, add_comma=True, remove_comma=True)
+    return func
+
+
+def _find_tuple_all(n: int) -> Callable[[], object]:
+    tokens = Tokens(src_to_tokens(_literal_tuple_nested(n)))
+    return lambda: [_find_tuple(i, tokens) for i in _brace_indices(tokens)]
+
+
+@pytest.mark.parametrize(
+    'func',
+    (_find_simple_all, _find_call_all, _fix_brace_all, _find_tuple_all),
+)
+def test_helper_scaling(func):
+    _assert_scales(DEPTHS, func)
+
+
+def test_assert_scales_catches_quadratic():
+    def quadratic(n: int) -> Callable[[], object]:
+        return lambda: [Tokens() for _ in range(n * n)]
+
+    with pytest.raises(AssertionError):
+        _assert_scales((10, 20, 40, 80), quadratic)
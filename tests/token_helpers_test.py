@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import math
+
+from tokenize_rt import ESCAPED_NL
+from tokenize_rt import Offset
+from tokenize_rt import src_to_tokens
+from tokenize_rt import Token
+from tokenize_rt import UNIMPORTANT_WS
+
+from add_trailing_comma._token_helpers import _IndentTree
+from add_trailing_comma._token_helpers import find_call
+from add_trailing_comma._token_helpers import find_simple
+from add_trailing_comma._token_helpers import Tokens
+
+
+def test_tokens_brace_table():
+    tokens = Tokens(src_to_tokens('x = [f(1, 2), (\n    3\n)]\n'))
+
+    last_brace, brace = tokens.find_close(4)
+    assert (last_brace, brace.commas, brace.single_line) == (20, 1, False)
+
+    last_brace, brace = tokens.find_close(6)
+    assert (last_brace, brace.commas, brace.single_line) == (11, 1, True)
+
+    last_brace, brace = tokens.find_close(14)
+    assert (last_brace, brace.commas, brace.single_line) == (19, 0, False)
+
+
+def test_tokens_single_line_fixes():
+    tokens = Tokens(src_to_tokens('x = [f(1, ), (2, 3), (\n    4 )]\n'))
+    assert tokens.single_line_fixes == {6}
+    assert tokens.fixable(4)
+    assert tokens.fixable(6)
+    assert not tokens.fixable(13)
+    assert tokens.fixable(21)
+
+
+def test_tokens_edits_do_not_shift_indices():
+    src = 'x = [(\n    3\n)]\n'
+    tokens = Tokens(src_to_tokens(src))
+    tokens.insert_after((8, -1), [Token('OP', ',')])
+    assert tokens.find_close(4)[0] == 11
+    assert tokens.find_close(5)[0] == 10
+    assert tokens.render(src) == 'x = [(\n    3,\n)]\n'
+    # the original tokens are unchanged, the cursors see the edits
+    assert tokens.original[9].name == 'NL'
+    assert tokens.get(tokens.next((8, -1))) == Token('OP', ',')
+
+
+def test_tokens_without_positions():
+    # older versions of tokenize-rt give whitespace and escaped newlines no
+    # position
+    src = (
+        '\\\n'
+        'f(\n'
+        "    '''\né'''  , a,  b, \\\n"
+        '    c)\n'
+    )
+    expected = src_to_tokens(src)
+    tokens = Tokens(
+        token._replace(line=None, utf8_byte_offset=None)
+        if token.name in {ESCAPED_NL, UNIMPORTANT_WS} else
+        token
+        for token in expected
+    )
+    assert tokens.original == expected
+
+
+def test_tokens_edits_of_inserted_tokens():
+    src = 'f(a, b)\n'
+    tokens = Tokens(src_to_tokens(src))
+    tokens.insert_before((2, -1), [Token('NAME', 'x'), Token('NAME', 'w')])
+    tokens.insert_after((2, 0), [Token('NAME', 'y')])
+    tokens.insert_before((2, 0), [Token(UNIMPORTANT_WS, ' ')])
+    assert tokens.render(src) == 'f( xywa, b)\n'
+
+    tokens.delete((2, 0), (2, 2))
+    tokens.delete((3, -1), (5, -1))
+    assert tokens.render(src) == 'f(ywab)\n'
+    assert tokens.next((2, -1)) == (5, -1)
+    assert tokens.prev((5, -1)) == (2, -1)
+    assert tokens.prev((2, 0)) == (1, -1)
+
+
+def test_tokens_render_reuses_unedited_text():
+    src = 'x = "☃"\nf(\n    "☃", "☃"\n)\n'
+    tokens = Tokens(src_to_tokens(src))
+    assert not tokens.dirty
+    assert tokens.render(src) is src
+
+    tokens.insert_after((13, -1), [Token('OP', ',')])
+    tokens.insert_before((15, -1), [Token(UNIMPORTANT_WS, '  ')])
+    tokens.insert_before((17, -1), [Token('COMMENT', '# ☃')])
+    assert tokens.dirty
+    expected = 'x = "☃"\nf(\n    "☃", "☃",\n  )\n# ☃'
+    assert tokens.render(src) == expected
+
+
+def test_find_simple_single_line():
+    tokens = Tokens(src_to_tokens('x = [1, 2]\n'))
+    assert find_simple(4, tokens) is None
+
+
+def test_find_call_skips_groups_before_arguments():
+    tokens = Tokens(src_to_tokens('(f)(\n    x\n)\n'))
+    fix_data = find_call({Offset(2, 4)}, 0, tokens)
+    assert fix_data is not None
+    assert fix_data.braces == (3, 8)
+    # the skipped group is jumped over rather than walked
+    assert tokens.counts['tokens_scanned', 'find_call'] == 5
+    assert tokens.counts['tokens_scanned', 'find_simple'] == 1
+    assert tokens.bracket_scans == {3: 6}
+
+
+def test_tokens_find_offset():
+    tokens = Tokens(src_to_tokens('if x:\n    f(1)\ny\n'))
+    assert tokens.find_offset(Offset(2, 5)) == 7
+    # the zero length `DEDENT` comes first
+    assert tokens.find_offset(Offset(3, 0)) == 11
+    assert tokens.find_offset(Offset(2, 0), lo=9) == 9
+
+
+def test_indent_tree():
+    tree = _IndentTree(5, {1: 4, 2: 8, 4: 0})
+    assert tree.min(0, 5) == 0
+    assert tree.min(1, 4) == 4
+    assert tree.min(0, 1) == math.inf
+
+    tree.add(1, 3, 4)
+    tree.add(2, 5, -2)
+    assert [tree[1], tree[2], tree[4]] == [8, 10, -2]
+    assert tree.min(1, 3) == 8
+
+    tree[2] = 1
+    assert tree.min(0, 4) == 1